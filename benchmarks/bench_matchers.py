@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# Мікробенчмарки для визначення дня, фільтра підгруп і fix_layout:
+# попередні реалізації (legacy_*) проти поточних.
+#
+#   python benchmarks/bench_matchers.py [--number N]
+import argparse
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import parser  # noqa: E402
+from bot import fix_layout  # noqa: E402
+from bench_parser import FixtureLoader, DAY_LINES  # noqa: E402
+
+
+# --- ПОПЕРЕДНІ РЕАЛІЗАЦІЇ ---
+def legacy_get_standard_day_name(line):
+    clean_line = re.sub(r'[^\w]', '', line).lower()
+    for standard_name, variants in parser.DAY_MAP.items():
+        for variant in variants:
+            if clean_line.startswith(variant):
+                return standard_name
+    return None
+
+def legacy_is_excluded_subgroup(text, current_subgroup):
+    if not current_subgroup: return False
+    ex_sub = str(3 - int(current_subgroup))
+    patterns = [f"\\({ex_sub}\\)", f"підгр\\.\\s*{ex_sub}", f"{ex_sub}\\s*п/г", f"підгрупа\\s*{ex_sub}"]
+    text_lower = text.lower()
+    for p in patterns:
+        if re.search(p, text_lower, re.IGNORECASE):
+            our_sub = str(current_subgroup)
+            if not re.search(f"\\({our_sub}\\)", text_lower): return True
+    return False
+
+def legacy_fix_layout(text):
+    if not text: return text
+    text = text.upper()
+    replacements = {'A': 'А', 'B': 'В', 'C': 'С', 'E': 'Е', 'H': 'Н', 'I': 'І', 'K': 'К', 'M': 'М', 'O': 'О', 'P': 'Р', 'T': 'Т', 'X': 'Х', 'Y': 'У'}
+    for lat, cyr in replacements.items():
+        text = text.replace(lat, cyr)
+    return text
+
+
+GROUP_INPUTS = ["av-11", "АВ-11", "kh-21", "ПІ-32", "ki-104", "Ip-11", "TX-1", "cі-43", "mh-12", "ПМ-41"]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Matcher micro-benchmarks (legacy vs current)")
+    ap.add_argument('--number', type=int, default=200)
+    args = ap.parse_args(argv)
+
+    loader = FixtureLoader()
+    schedule = parser.parse_page(loader.pages['КН-21'][0], 'КН-21')
+    texts = [lesson.text for lesson in schedule.lessons]
+
+    pairs = [
+        ("get_standard_day_name", legacy_get_standard_day_name, parser.get_standard_day_name, DAY_LINES),
+        ("is_excluded_subgroup[1]", lambda t: legacy_is_excluded_subgroup(t, "1"), lambda t: parser.is_excluded_subgroup(t, "1"), texts),
+        ("is_excluded_subgroup[2]", lambda t: legacy_is_excluded_subgroup(t, "2"), lambda t: parser.is_excluded_subgroup(t, "2"), texts),
+        ("fix_layout", legacy_fix_layout, fix_layout, GROUP_INPUTS),
+    ]
+
+    print(f"{'case':<26}  {'legacy µs/call':>15}  {'current µs/call':>15}  {'speedup':>8}")
+    for name, legacy, current, inputs in pairs:
+        assert [legacy(x) for x in inputs] == [current(x) for x in inputs], name
+        calls = args.number * len(inputs)
+        t_legacy = timeit.timeit(lambda: [legacy(x) for x in inputs], number=args.number) / calls * 1e6
+        t_current = timeit.timeit(lambda: [current(x) for x in inputs], number=args.number) / calls * 1e6
+        print(f"{name:<26}  {t_legacy:>15.3f}  {t_current:>15.3f}  {t_legacy / t_current:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# Офлайн-бенчмарк парсера на збережених сторінках student.lpnu.ua (benchmarks/fixtures).
+#
+#   python benchmarks/bench_parser.py                      # звіт
+#   python benchmarks/bench_parser.py --save before.json   # зберегти базову лінію
+#   python benchmarks/bench_parser.py --compare before.json
+#
+# Для кожного кейсу: медіана/мінімум часу, пік пам'яті (tracemalloc) і скільки блоків
+# пам'яті лишається живими разом з результатом.
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import parser  # noqa: E402
+
+FIXTURES_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+
+# група -> (сторінка для semestrduration=1, для semestrduration=2)
+PAGES = {
+    'АВ-11': ('grid.html', None),
+    'КН-21': ('grid_large.html', None),
+    'ТХ-1': ('text.html', None),
+    'ПМ-41': ('empty.html', 'grid.html'),   # перша половина семестру порожня
+    'НЕМА-1': ('not_found.html', 'not_found.html'),
+}
+
+DAY_LINES = ["Пн", "Понеділок", "вт.", "Вівторок", "Ср", "cp", "Четвер", "пт", "П'ятниця", "Сб", "Нд",
+             "Mon", "tue", "Wed", "thu", "fri", "1 пара", "Математика", ""]
+
+
+class FixtureResponse:
+    __slots__ = ('status_code', 'text')
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+
+# Замінник parser.make_request: віддає збережені сторінки замість мережі
+class FixtureLoader:
+    def __init__(self, pages=PAGES, fixtures_dir=FIXTURES_DIR):
+        self.pages = {}
+        for group, files in pages.items():
+            self.pages[group] = tuple(self._read(fixtures_dir, f) if f else None for f in files)
+
+    @staticmethod
+    def _read(fixtures_dir, name):
+        with open(os.path.join(fixtures_dir, name), encoding='utf-8') as f:
+            return f.read()
+
+    def __call__(self, group_name, semester, duration):
+        pages = self.pages.get(group_name)
+        if pages is None: return FixtureResponse(404, "")
+        text = pages[0] if duration == "1" else pages[1]
+        if text is None: return FixtureResponse(404, "")
+        return FixtureResponse(200, text)
+
+
+def with_mode(mode, fn):
+    def run():
+        old = parser.PARSER_MODE
+        parser.PARSER_MODE = mode
+        try: return fn()
+        finally: parser.PARSER_MODE = old
+    return run
+
+
+def build_cases(loader):
+    cases = {}
+    for group, (first, _) in PAGES.items():
+        page = loader.pages[group][0]
+        for mode in ('fast', 'classic'):
+            cases[f"parse_page[{mode}] {first}"] = with_mode(mode, lambda page=page, group=group: parser.parse_page(page, group))
+
+    for group in PAGES:
+        cases[f"fetch_schedule_dict {group}"] = lambda group=group: parser.fetch_schedule_dict(group, request=loader)
+
+    schedule = parser.parse_page(loader.pages['КН-21'][0], 'КН-21')
+    texts = [lesson.text for lesson in schedule.lessons]
+    cases["get_standard_day_name x1000"] = lambda: [parser.get_standard_day_name(line) for _ in range(1000 // len(DAY_LINES) + 1) for line in DAY_LINES]
+    cases[f"is_excluded_subgroup x{len(texts) * 2}"] = lambda: [parser.is_excluded_subgroup(t, s) for t in texts for s in parser.SUBGROUPS]
+    cases["render_schedule x9 views"] = lambda: [parser.render_schedule(schedule, s, w) for s in (None, "1", "2") for w in (None, "chys", "znam")]
+    return cases
+
+
+def measure(fn, repeat):
+    fn()  # прогрів
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del result
+
+    return {
+        'median_ms': round(statistics.median(times) * 1000, 4),
+        'min_ms': round(min(times) * 1000, 4),
+        'peak_kib': round(peak / 1024, 1),
+        'blocks': blocks,
+    }
+
+
+def print_report(results, baseline=None):
+    width = max(len(name) for name in results)
+    if baseline:
+        print(f"{'case':<{width}}  {'before ms':>10}  {'after ms':>10}  {'delta':>8}  {'peak KiB':>9}")
+    else:
+        print(f"{'case':<{width}}  {'median ms':>10}  {'min ms':>10}  {'peak KiB':>9}  {'blocks':>8}")
+    for name, r in results.items():
+        if baseline:
+            before = baseline.get(name)
+            if before:
+                delta = (r['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0.0
+                print(f"{name:<{width}}  {before['median_ms']:>10.3f}  {r['median_ms']:>10.3f}  {delta:>+7.1f}%  {r['peak_kib']:>9.1f}")
+            else:
+                print(f"{name:<{width}}  {'-':>10}  {r['median_ms']:>10.3f}  {'new':>8}  {r['peak_kib']:>9.1f}")
+        else:
+            print(f"{name:<{width}}  {r['median_ms']:>10.3f}  {r['min_ms']:>10.3f}  {r['peak_kib']:>9.1f}  {r['blocks']:>8}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parser benchmarks on recorded student.lpnu.ua pages")
+    ap.add_argument('--repeat', type=int, default=20)
+    ap.add_argument('--filter', default='', help="run only cases containing this substring")
+    ap.add_argument('--save', help="write results to a JSON baseline")
+    ap.add_argument('--compare', help="compare against a saved JSON baseline")
+    args = ap.parse_args(argv)
+
+    loader = FixtureLoader()
+    cases = {name: fn for name, fn in build_cases(loader).items() if args.filter in name}
+    results = {name: measure(fn, args.repeat) for name, fn in cases.items()}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print(f"html parser (fast mode): {parser.FAST_HTML_PARSER}")
+    print_report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'html_parser': parser.FAST_HTML_PARSER, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# Навантажувальний тест: симульовані користувачі проходять справжні хендлери бота
+# (/rozklad -> sub -> week -> fd -> back_days -> fd ...) з підробленими Update/CallbackQuery,
+# а upstream - локальний фейковий student.lpnu.ua з налаштовуваною затримкою (окремий процес).
+#
+#   python benchmarks/loadtest.py                                  # 10, 50, 200 користувачів
+#   python benchmarks/loadtest.py --users 50,500 --latency 0.8 --groups 100
+#   python benchmarks/loadtest.py --warm --by-action
+#
+# Для кожного рівня: p50/p95/p99 часу хендлера, дій за секунду, запитів до upstream і
+# приріст пам'яті процесу (RSS).
+import argparse
+import asyncio
+import gc
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# До імпорту бота: окреме сховище і без логів повільних запитів
+os.environ.setdefault('STORE_PATH', os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'schedule.db'))
+os.environ.setdefault('TRACE_SLOW_REQUESTS', '0')
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+import bot  # noqa: E402
+from bench_parser import FIXTURES_DIR  # noqa: E402
+from callbacks import decode  # noqa: E402
+from fetcher import UpstreamClient  # noqa: E402
+from group_index import GroupIndex  # noqa: E402
+from metrics import UPSTREAM_RESPONSES  # noqa: E402
+from parser import GROUP_SELECT_RE  # noqa: E402
+from prewarm import GroupPopularity, Prewarmer  # noqa: E402
+from store import ScheduleStore  # noqa: E402
+
+GROUP_PREFIX = "ЛТ-"
+GROUP_PAGES = ('grid.html', 'grid_large.html', 'text.html')
+UPSTREAM_START_TIMEOUT = 10.0
+
+
+# --- ФЕЙКОВИЙ UPSTREAM ---
+# ЛТ-<n> -> одна із записаних сторінок; решта - "не знайдено". Фільтр груп на сторінках
+# перелічує ЛТ-1..ЛТ-<groups>, тож індекс бота засівається саме ними.
+def upstream_app(latency, jitter, groups):
+    options = "".join(f'<option value="{GROUP_PREFIX}{n}">{GROUP_PREFIX}{n}</option>' for n in range(1, groups + 1))
+    pages = {}
+    for name in GROUP_PAGES + ('not_found.html',):
+        with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+            page = f.read()
+        select = GROUP_SELECT_RE.search(page)
+        pages[name] = page[:select.start(1)] + options + page[select.end(1):] if select else page
+
+    async def schedule(request):
+        await asyncio.sleep(max(0.0, random.gauss(latency, jitter)))
+        group = request.query.get('studygroup_abbrname', '')
+        number = group[len(GROUP_PREFIX):]
+        if group.startswith(GROUP_PREFIX) and number.isdigit():
+            page = pages[GROUP_PAGES[int(number) % len(GROUP_PAGES)]]
+        else:
+            page = pages['not_found.html']
+        return web.Response(text=page, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/students_schedule', schedule)
+    return app
+
+
+# Порт 0 - вільний порт від ОС; справжній порт повертаємо батьківському процесу через ready
+def serve_upstream(port, latency, jitter, groups, ready):
+    logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
+
+    async def serve():
+        runner = web.AppRunner(upstream_app(latency, jitter, groups))
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', port)
+        await site.start()
+        ready.send(runner.addresses[0][1])
+        ready.close()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+# Чекаємо на порт від дочірнього процесу; якщо той впав (порт зайнятий тощо) - падаємо одразу
+async def wait_for_upstream(upstream, ready, timeout=UPSTREAM_START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not ready.poll():
+        if not upstream.is_alive():
+            raise RuntimeError(f"fake upstream exited with code {upstream.exitcode}")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"fake upstream did not start in {timeout}s")
+        await asyncio.sleep(0.05)
+    try:
+        port = ready.recv()
+    except EOFError:  # процес закрив трубу, не надіславши порт
+        upstream.join(timeout)
+        raise RuntimeError(f"fake upstream exited with code {upstream.exitcode}") from None
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{port}/students_schedule") as resp:
+            resp.raise_for_status()
+    return port
+
+
+# --- ПІДРОБЛЕНІ ОБ'ЄКТИ TELEGRAM ---
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakeMessage:
+    def __init__(self, session, chat_id):
+        self.session = session
+        self.chat_id = chat_id
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        await self.session.telegram_call()
+        self.session.markup = reply_markup
+
+
+class FakeCallbackQuery:
+    def __init__(self, session, data):
+        self.session = session
+        self.data = data
+        self.message = FakeMessage(session, session.chat_id)
+
+    async def answer(self):
+        await self.session.telegram_call()
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        await self.session.telegram_call()
+        self.session.markup = reply_markup
+
+
+class FakeUpdate:
+    def __init__(self, session, data=None):
+        self.effective_chat = FakeChat(session.chat_id)
+        self.message = FakeMessage(session, session.chat_id)
+        self.callback_query = FakeCallbackQuery(session, data) if data is not None else None
+
+
+class FakeContext:
+    def __init__(self, args=()):
+        self.args = list(args)
+
+
+# --- СЕСІЯ КОРИСТУВАЧА ---
+class Session:
+    def __init__(self, chat_id, group, telegram_latency, samples):
+        self.chat_id = chat_id
+        self.group = group
+        self.telegram_latency = telegram_latency
+        self.samples = samples
+        self.markup = None
+
+    async def telegram_call(self):
+        if self.telegram_latency: await asyncio.sleep(self.telegram_latency)
+
+    def buttons(self, action):
+        if self.markup is None: return []
+        return [b.callback_data for row in self.markup.inline_keyboard for b in row
+                if decode(b.callback_data).action == action]
+
+    async def timed(self, action, call):
+        started = time.perf_counter()
+        try:
+            await call
+            ok = True
+        except Exception as e:
+            logging.warning(f"{action} failed: {e!r}")
+            ok = False
+        self.samples.append((action, time.perf_counter() - started, ok))
+
+    async def click(self, action, choose=random.choice):
+        options = self.buttons(action)
+        if not options: return False
+        data = choose(options)
+        await self.timed(action, bot.button_handler(FakeUpdate(self, data), None))
+        return True
+
+    async def run(self, day_views, think):
+        await self.timed('rozklad', bot.get_rozklad(FakeUpdate(self), FakeContext([self.group])))
+        # Поки індекс не засіяно, невідома назва -> кнопки-підказки; тиснемо свою групу
+        await self.click('grp', lambda options: next((o for o in options if decode(o).group == self.group), options[0]))
+        for action in ('sub', 'week'):
+            await asyncio.sleep(random.random() * think)
+            if not await self.click(action): return
+        for _ in range(day_views):
+            await asyncio.sleep(random.random() * think)
+            if not await self.click('fd'): return
+            await asyncio.sleep(random.random() * think)
+            if not await self.click('back_days'): return
+
+
+# --- ЗАМІРИ ---
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def upstream_requests():
+    return sum(value for *_, value in UPSTREAM_RESPONSES.samples())
+
+
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarize(samples):
+    times = [elapsed for _, elapsed, _ in samples]
+    return {
+        'count': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'p50': percentile(times, 50) * 1000,
+        'p95': percentile(times, 95) * 1000,
+        'p99': percentile(times, 99) * 1000,
+        'mean': statistics.fmean(times) * 1000 if times else 0.0,
+    }
+
+
+# Холодний старт рівня: порожні кеші, індекс груп, популярність і нове сховище на диску
+async def reset_bot_state(level):
+    bot.GROUP_CACHE.clear()
+    bot.RENDERED.clear()
+    bot.FETCHED_AT.clear()
+    await bot.STATE.close()
+    bot.STATE = bot.PUSH_SCHEDULER.state = bot.make_backend()
+    bot.STORE.close()
+    bot.STORE = ScheduleStore(os.path.join(os.path.dirname(os.environ['STORE_PATH']), f"level-{level}.db"))
+    bot.GROUP_INDEX = GroupIndex()
+    bot.POPULARITY = GroupPopularity()
+    bot.PREWARMER = Prewarmer(bot.GROUP_CACHE, bot.fetch_shared, bot.POPULARITY, bot.group_key, cacheable=bot.is_schedule)
+    bot.UPSTREAM.validators.clear()
+    bot.UPSTREAM.content_hashes.clear()
+
+
+async def run_level(users, args, upstream_url):
+    if not args.warm: await reset_bot_state(users)
+    bot.UPSTREAM = UpstreamClient(base_url=upstream_url, scraper_api_key=None, concurrency=args.upstream_concurrency,
+                                  rate=args.upstream_rate, burst=args.upstream_burst)
+    requests_before = upstream_requests()
+    gc.collect()
+    rss_before = rss_bytes()
+
+    samples = []
+    groups = [f"{GROUP_PREFIX}{n}" for n in range(1, args.groups + 1)]
+    sessions = [Session(100000 + i, random.choice(groups), args.telegram_latency, samples) for i in range(users)]
+
+    async def user(session, delay):
+        await asyncio.sleep(delay)
+        for _ in range(args.sessions):
+            await session.run(args.day_views, args.think)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(s, random.random() * args.ramp) for s in sessions))
+    elapsed = time.perf_counter() - started
+    await bot.UPSTREAM.close()
+
+    gc.collect()
+    result = summarize(samples)
+    result.update({
+        'users': users,
+        'throughput': len(samples) / elapsed if elapsed else 0.0,
+        'upstream': upstream_requests() - requests_before,
+        'rss_mib': (rss_bytes() - rss_before) / 2 ** 20,
+        'by_action': {action: summarize([s for s in samples if s[0] == action])
+                      for action in dict.fromkeys(a for a, _, _ in samples)},
+    })
+    return result
+
+
+def print_header():
+    print(f"{'users':>6}  {'actions':>8}  {'errors':>6}  {'act/s':>8}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  "
+          f"{'upstream':>8}  {'ΔRSS MiB':>9}")
+
+
+def print_report(results, by_action=False):
+    for r in results:
+        print(f"{r['users']:>6}  {r['count']:>8}  {r['errors']:>6}  {r['throughput']:>8.1f}  {r['p50']:>8.1f}  "
+              f"{r['p95']:>8.1f}  {r['p99']:>8.1f}  {r['upstream']:>8}  {r['rss_mib']:>+9.1f}")
+        if by_action:
+            for action, a in r['by_action'].items():
+                print(f"{'':>6}  {a['count']:>8}  {a['errors']:>6}  {action:>8}  {a['p50']:>8.1f}  {a['p95']:>8.1f}  {a['p99']:>8.1f}")
+
+
+async def main_async(args):
+    ready, child_ready = multiprocessing.Pipe(duplex=False)
+    upstream = multiprocessing.Process(target=serve_upstream, args=(args.port, args.latency, args.jitter, args.groups, child_ready), daemon=True)
+    upstream.start()
+    child_ready.close()
+    try:
+        port = await wait_for_upstream(upstream, ready)
+        results = []
+        print_header()
+        for users in args.users:
+            results.append(await run_level(users, args, f"http://127.0.0.1:{port}"))
+            print_report(results[-1:], args.by_action)
+        return results
+    finally:
+        upstream.terminate()
+        upstream.join()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay simulated user sessions against the bot handlers")
+    ap.add_argument('--users', type=lambda s: [int(x) for x in s.split(',')], default=[10, 50, 200],
+                    help="comma-separated simulated user counts, one run per value")
+    ap.add_argument('--groups', type=int, default=50, help="distinct groups users pick from")
+    ap.add_argument('--sessions', type=int, default=1, help="sessions per user")
+    ap.add_argument('--day-views', type=int, default=3, help="fd/back_days round trips per session")
+    ap.add_argument('--think', type=float, default=0.2, help="max think time between clicks, seconds")
+    ap.add_argument('--ramp', type=float, default=2.0, help="spread user start times over N seconds")
+    ap.add_argument('--latency', type=float, default=0.3, help="fake upstream latency, seconds")
+    ap.add_argument('--jitter', type=float, default=0.1)
+    ap.add_argument('--telegram-latency', type=float, default=0.0, help="simulated Bot API call latency, seconds")
+    ap.add_argument('--upstream-rate', type=float, default=1000.0)
+    ap.add_argument('--upstream-burst', type=int, default=1000)
+    ap.add_argument('--upstream-concurrency', type=int, default=4)
+    ap.add_argument('--warm', action='store_true', help="keep caches between levels")
+    ap.add_argument('--by-action', action='store_true', help="per-action latency breakdown")
+    ap.add_argument('--port', type=int, default=0, help="fake upstream port, 0 - any free port")
+    args = ap.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)  # bot.py вмикає INFO при імпорті
+    print(f"upstream latency {args.latency}s ±{args.jitter}, {args.groups} groups, store {os.environ['STORE_PATH']}")
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
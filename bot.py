@@ -1,39 +1,68 @@
+import html
 import logging
 import os
 import threading
 import asyncio
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden
+from datetime import datetime
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
-from parser import fetch_schedule_dict
+from parser import Schedule, SUBGROUPS, render_day, render_schedule
+from fetcher import UpstreamClient, fetch_schedule
+from prewarm import GroupPopularity, Prewarmer
+from store import ScheduleStore
+from metrics import REGISTRY, stage, traced
+from cache import ScheduleCache, RenderCache
+from callbacks import encode, decode
+from group_index import GroupIndex
+from state import make_backend, schedule_key, SharedRateLimiter, FETCH_LOCK_WAIT
+from push import Dispatcher, PushScheduler, PUSH_TZ
+from webhook import WebhookServer, WEBHOOK_URL, UPDATE_CONCURRENCY
 
 # --- FLASK ---
-from flask import Flask
+# Лише для режиму polling; у режимі вебхука ці ж маршрути віддає webhook.WebhookServer
+from flask import Flask, Response
 app = Flask(__name__)
 @app.route('/')
 def health_check(): return "Bot is running!"
 @app.route('/health')
 def health(): return "OK"
+@app.route('/metrics')
+def metrics(): return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-USER_GROUPS = {} 
-SCHEDULE_CACHE = {}
+GROUP_CACHE = ScheduleCache()
+RENDERED = RenderCache()
+# Спільний стан реплік (Redis за STATE_URL) або пам'ять процесу; GROUP_CACHE лишається локальним L1
+STATE = make_backend()
+UPSTREAM = UpstreamClient(limiter=SharedRateLimiter(STATE) if STATE.shared else None)
+STORE = ScheduleStore()
+SEMESTER = "1"
+DURATION = "1"
+POPULARITY = GroupPopularity()
+WEBHOOK = None
+TELEGRAM_BOT = None  # application.bot, задається при старті
+# Прострочений розклад віддається одразу (з позначкою "дані станом на"), оновлення йде у фоні
+SERVE_STALE = os.environ.get('SERVE_STALE', '1') == '1'
+BACKGROUND_REFRESHES = set()
+FETCHED_AT = {}  # ключ -> time.time() отримання розкладу, який зараз віддаємо (для "дані станом на")
+GROUP_INDEX = GroupIndex()
 TARGET_DAYS = ["Понеділок", "Вівторок", "Середа", "Четвер", "П'ятниця"]
 DAY_SHORT_NAMES = {"Понеділок": "Пн", "Вівторок": "Вт", "Середа": "Ср", "Четвер": "Чт", "П'ятниця": "Пт"}
 
 # --- АВТО-ВИПРАВЛЕННЯ РОЗКЛАДКИ ---
+LAYOUT_TABLE = str.maketrans({'A': 'А', 'B': 'В', 'C': 'С', 'E': 'Е', 'H': 'Н', 'I': 'І', 'K': 'К', 'M': 'М', 'O': 'О', 'P': 'Р', 'T': 'Т', 'X': 'Х', 'Y': 'У'})
+
 def fix_layout(text):
     if not text: return text
-    text = text.upper()
-    replacements = {'A': 'А', 'B': 'В', 'C': 'С', 'E': 'Е', 'H': 'Н', 'I': 'І', 'K': 'К', 'M': 'М', 'O': 'О', 'P': 'Р', 'T': 'Т', 'X': 'Х', 'Y': 'У'}
-    for lat, cyr in replacements.items():
-        text = text.replace(lat, cyr)
-    return text
+    return text.upper().translate(LAYOUT_TABLE)
 
 # --- КОМАНДИ ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    text = "👋 <b>Привіт! Я бот розкладу ЛП.</b>\n\nВведіть команду:\n👉 <code>/rozklad АВ-11</code>\n🛠 /support - підтримка"
+    text = "👋 <b>Привіт! Я бот розкладу ЛП.</b>\n\nВведіть команду:\n👉 <code>/rozklad АВ-11</code>\n🔔 <code>/subscribe 07:30</code> - пари щоранку\n🛠 /support - підтримка"
     await update.message.reply_text(text, parse_mode='HTML')
 
 async def get_rozklad(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -43,14 +72,62 @@ async def get_rozklad(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     if len(args) > 0:
         group = fix_layout(args[0])
     
-    USER_GROUPS[chat_id] = group
+    # Назва, що не влазить у callback_data, - лише текстом, без кнопок
+    if not group_fits(group):
+        await update.message.reply_text(f"❌ Назва <b>{html.escape(group)}</b> задовга або містить недопустимі символи.\n"
+                                        f"Перевірте її: <code>/rozklad АВ-11</code>", parse_mode='HTML')
+        return
 
-    keyboard = [
-        [InlineKeyboardButton("👤 1 підгрупа", callback_data=f"sub_1_{group}"),
-         InlineKeyboardButton("👤 2 підгрупа", callback_data=f"sub_2_{group}")],
-        [InlineKeyboardButton("👥 Вся група", callback_data=f"sub_all_{group}")]
-    ]
-    await update.message.reply_text(f"🎓 Група: <b>{group}</b>\nОберіть підгрупу:", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    # Відома назва - у вигляді з індексу ("АВ_11" -> "АВ-11"); невідома - підказки замість запиту до сайту
+    indexed = GROUP_INDEX.get(group)
+    if indexed:
+        group = indexed
+    elif len(GROUP_INDEX):
+        suggestions = GROUP_INDEX.suggest(group)
+        if not GROUP_INDEX.is_complete():
+            hint = " Можливо, ви мали на увазі:" if suggestions else ""
+            await update.message.reply_text(f"🔎 Група <b>{html.escape(group)}</b> боту ще не відома.{hint}",
+                                            reply_markup=suggestions_keyboard(group, suggestions), parse_mode='HTML')
+        elif suggestions:
+            await update.message.reply_text(f"🔎 Групу <b>{html.escape(group)}</b> не знайдено. Можливо, ви мали на увазі:",
+                                            reply_markup=suggestions_keyboard(group, suggestions), parse_mode='HTML')
+        else:
+            await update.message.reply_text(f"❌ Групу <b>{html.escape(group)}</b> не знайдено.", parse_mode='HTML')
+        return
+
+    await select_group(chat_id, group)
+    await update.message.reply_text(f"🎓 Група: <b>{html.escape(group)}</b>\nОберіть підгрупу:", reply_markup=subgroup_keyboard(group), parse_mode='HTML')
+
+# /subscribe [HH:MM] [1|2|all] [chys|znam|all] - щоденна розсилка пар для поточної групи
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = update.effective_chat.id
+    group = await STATE.get_user_group(chat_id)
+    if not group:
+        await update.message.reply_text("Спершу оберіть групу: <code>/rozklad ГРУПА</code>", parse_mode='HTML')
+        return
+
+    args = context.args or []
+    sb = args[1] if len(args) > 1 else "all"
+    wk = args[2] if len(args) > 2 else "all"
+    try:
+        send_at = datetime.strptime(args[0] if args else "07:30", "%H:%M").strftime("%H:%M")
+        if sb not in ("1", "2", "all") or wk not in ("chys", "znam", "all"): raise ValueError(sb, wk)
+    except ValueError:
+        await update.message.reply_text("Формат: <code>/subscribe 07:30 [1|2|all] [chys|znam|all]</code>", parse_mode='HTML')
+        return
+
+    await STATE.set_subscription(chat_id, group, sb, wk, send_at)
+    STORE.set_subscription(chat_id, group, sb, wk, send_at)
+    await update.message.reply_text(f"🔔 Щодня о {send_at} надсилатиму пари <b>{group}</b> ({sub_name_of(sb)}, {week_name_of(wk)}).\n"
+                                    f"Скасувати: /unsubscribe", parse_mode='HTML')
+
+async def drop_subscription(chat_id):
+    await STATE.delete_subscription(chat_id)
+    STORE.delete_subscription(chat_id)
+
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await drop_subscription(update.effective_chat.id)
+    await update.message.reply_text("🔕 Розсилку вимкнено.")
 
 async def info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("ℹ️ Бот парсить дані з student.lpnu.ua")
@@ -58,191 +135,354 @@ async def info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def support(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("🛠 Підтримка: <code>4441111131351441</code>", parse_mode='HTML')
 
+async def select_group(chat_id, group):
+    STORE.set_user_group(chat_id, group)
+    await STATE.set_user_group(chat_id, group)
+    POPULARITY.record(group)
+
+def subgroup_keyboard(group):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("👤 1 підгрупа", callback_data=encode('sub', group, "1")),
+         InlineKeyboardButton("👤 2 підгрупа", callback_data=encode('sub', group, "2"))],
+        [InlineKeyboardButton("👥 Вся група", callback_data=encode('sub', group, "all"))]
+    ])
+
+# Найдовша кнопка з назвою групи - день тижня; якщо вона не влазить у 64 байти, кнопок для групи не буде
+def group_fits(group):
+    try:
+        encode('fd', group, "all", "chys", DAY_SHORT_NAMES["Понеділок"])
+        return True
+    except ValueError:
+        return False
+
+# Поки індекс не засіяно повним списком груп, назва може просто ще не траплятись - лишаємо кнопку "шукати як є"
+def suggestions_keyboard(group, suggestions):
+    keyboard = [[InlineKeyboardButton(name, callback_data=encode('grp', name))] for name in suggestions if group_fits(name)]
+    if not GROUP_INDEX.is_complete():
+        keyboard.append([InlineKeyboardButton(f"🔎 Шукати «{group}»", callback_data=encode('grp', group))])
+    return InlineKeyboardMarkup(keyboard)
+
 # --- LOAD LOGIC ---
-async def load_schedule_and_show_days(query, group, sub_param, sub_name, week_param, week_name, retry=False):
-    chat_id = query.message.chat_id
-    if not retry:
-        await query.edit_message_text(f"⏳ Отримую розклад: <b>{group}</b>, {sub_name}, {week_name}...", parse_mode='HTML')
-        
+def group_key(group):
+    return (group, SEMESTER, DURATION)
+
+def is_schedule(value):
+    return isinstance(value, Schedule)
+
+async def on_schedule_changed(group, schedule):
+    logger.info(f"Розклад {group} змінився")
+    RENDERED.invalidate_group(group)
+    for chat_id, (sub_group, *_) in (await STATE.get_subscriptions()).items():
+        if sub_group == group:
+            DISPATCHER.submit(chat_id, f"🔔 Розклад <b>{group}</b> змінився: /rozklad {group}", parse_mode='HTML')
+
+# Запит з умовою: якщо сторінка не змінилась, повертається попередній об'єкт без парсингу
+async def fetch_and_store(group):
+    key = group_key(group)
+    previous = GROUP_CACHE.peek(key) or await STORE.load_schedule(key)
+    schedule = await fetch_schedule(UPSTREAM, group, SEMESTER, previous)
+    if UPSTREAM.group_names and not GROUP_INDEX.is_complete():
+        await seed_group_index(UPSTREAM.group_names)
+    if is_schedule(schedule):
+        fetched_at = FETCHED_AT[key] = time.time()
+        STORE.put_schedule(key, schedule, fetched_at)
+        await STATE.put_schedule(key, schedule, fetched_at=fetched_at)
+        GROUP_INDEX.add(group)
+        if previous is not None and not schedule.same_as(previous):
+            await on_schedule_changed(group, schedule)
+    return schedule
+
+async def seed_group_index(names):
+    GROUP_INDEX.seed(names)
+    await asyncio.get_running_loop().run_in_executor(None, STORE.set_group_names, names)
+
+# Одна репліка тягне групу, решта чекають на її результат у спільному стані
+async def fetch_shared(group):
+    key = group_key(group)
+    lock = schedule_key(key)
+    token = await STATE.acquire_lock(lock)
+    if token is None:
+        entry = await STATE.wait_schedule_entry(key, FETCH_LOCK_WAIT)
+        if entry is not None: return remember_entry(key, entry)
+        token = await STATE.acquire_lock(lock)
     try:
-        loop = asyncio.get_running_loop()
-        schedule_data = await loop.run_in_executor(None, fetch_schedule_dict, group, "1", "1", sub_param, week_param)
-        
-        if not schedule_data or "Info" in schedule_data:
-            msg = schedule_data.get("Info", "❌ Помилка.") if schedule_data else "❌ Помилка."
-            kb = [[InlineKeyboardButton("🔙 Спробувати іншу групу", callback_data="restart_full")]]
-            await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(kb), parse_mode='HTML')
-            return
+        return await fetch_and_store(group)
+    finally:
+        if token is not None: await STATE.release_lock(lock, token)
+
+def remember_entry(key, entry):
+    fetched_at, schedule = entry
+    FETCHED_AT[key] = fetched_at
+    return schedule
+
+async def shared_schedule(key):
+    entry = await STATE.get_schedule_entry(key)
+    return remember_entry(key, entry) if entry is not None else None
+
+# Спершу спільний стан, потім диск (якщо запис не старший за TTL кешу), потім мережа
+async def load_group_schedule(group):
+    key = group_key(group)
+    schedule = await shared_schedule(key)
+    if schedule is not None: return schedule
+    fetched_at = STORE.fetched_at(key)
+    if fetched_at and time.time() - fetched_at < GROUP_CACHE.ttl:
+        schedule = await STORE.load_schedule(key)
+        if schedule: return remember_entry(key, (fetched_at, schedule))
+    return await fetch_shared(group)
+
+def refresh_in_background(group):
+    key = group_key(group)
+    task = asyncio.ensure_future(GROUP_CACHE.get_or_fetch(key, lambda: load_group_schedule(group), cacheable=is_schedule))
+    BACKGROUND_REFRESHES.add(task)
+    task.add_done_callback(BACKGROUND_REFRESHES.discard)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+# Розклад групи (без фільтрів) кешується один на весь процес; помилки ({"Info": ...}) не кешуються.
+# Промах L1: спершу спільний стан (інша репліка могла вже оновити), потім застарілий локальний запис.
+async def get_group_schedule(group):
+    key = group_key(group)
+    if key in GROUP_CACHE:
+        PREWARMER.note_cache_hit(key)
+    else:
+        PREWARMER.note_cache_miss(key)
+        schedule = await shared_schedule(key)
+        if schedule is not None:
+            GROUP_CACHE.put(key, schedule, max(0.0, GROUP_CACHE.ttl - (time.time() - FETCHED_AT[key])))
+            return schedule
+        stale = None
+        if SERVE_STALE:
+            stale = GROUP_CACHE.peek(key)
+            if stale is None:
+                stale = await STORE.load_schedule(key)
+                if stale is not None: FETCHED_AT[key] = STORE.fetched_at(key)
+        if stale is not None:
+            refresh_in_background(group)
+            return stale
+    return await GROUP_CACHE.get_or_fetch(key, lambda: load_group_schedule(group), cacheable=is_schedule)
+
+# Позначка для розкладу, старшого за TTL кешу (віддали застарілі дані, поки upstream оновлюється)
+def data_as_of(group):
+    key = group_key(group)
+    fetched_at = FETCHED_AT.get(key) or STORE.fetched_at(key)
+    if fetched_at is None or time.time() - fetched_at < GROUP_CACHE.ttl: return ""
+    return f"\n\n🕓 <i>Дані станом на {datetime.fromtimestamp(fetched_at, PUSH_TZ):%d.%m %H:%M}</i>"
+
+PREWARMER = Prewarmer(GROUP_CACHE, fetch_shared, POPULARITY, group_key, cacheable=is_schedule)
+
+# --- METRICS ---
+REGISTRY.gauge('schedule_cache_entries', "Groups in the shared schedule cache", lambda: len(GROUP_CACHE))
+REGISTRY.counter('schedule_cache_hits_total', "Shared cache hits", lambda: GROUP_CACHE.hits)
+REGISTRY.counter('schedule_cache_misses_total', "Shared cache misses", lambda: GROUP_CACHE.misses)
+REGISTRY.counter('schedule_cache_evictions_total', "Shared cache LRU evictions", lambda: GROUP_CACHE.evictions)
+REGISTRY.counter('schedule_cache_coalesced_total', "Requests that waited on an in-flight fetch", lambda: GROUP_CACHE.coalesced)
+REGISTRY.gauge('schedule_cache_hit_ratio', "Shared cache hit ratio", lambda: GROUP_CACHE.stats()['hit_rate'])
+REGISTRY.counter('upstream_not_modified_total', "Upstream 304 responses", lambda: UPSTREAM.not_modified)
+REGISTRY.counter('upstream_unchanged_total', "Fetched pages whose view-content hash did not change", lambda: UPSTREAM.unchanged)
+REGISTRY.gauge('render_cache_entries', "Pre-rendered day views and keyboards", lambda: len(RENDERED))
+REGISTRY.counter('render_cache_hits_total', "Render cache hits", lambda: RENDERED.hits)
+REGISTRY.counter('render_cache_misses_total', "Render cache misses", lambda: RENDERED.misses)
+REGISTRY.gauge('stale_refreshes_inflight', "Background refreshes behind stale-served schedules", lambda: len(BACKGROUND_REFRESHES))
+REGISTRY.counter('prewarm_refreshes_total', "Background refreshes done", lambda: PREWARMER.refreshes)
+REGISTRY.counter('prewarm_latency_saved_seconds_total', "Fetch time saved by pre-warmed entries", lambda: PREWARMER.latency_saved)
+
+async def edit_message(query, text, **kwargs):
+    with stage('telegram_edit'):
+        return await query.edit_message_text(text, **kwargs)
+
+def sub_param_of(sb):
+    return sb if sb in SUBGROUPS else None
 
-        SCHEDULE_CACHE[chat_id] = {
-            'data': schedule_data, 'group': group, 
-            'sub': sub_param, 'sub_n': sub_name,
-            'week': week_param, 'week_n': week_name
-        }
-
-        keyboard = []
-        row = []
-        for day_name in TARGET_DAYS:
-            if day_name in schedule_data:
-                short = DAY_SHORT_NAMES.get(day_name, day_name)
-                wk = week_param if week_param else 'all'
-                sb = sub_param if sub_param else 'all'
-                
-                callback = f"fd_{day_name[:2]}_{group}_{sb}_{wk}"
-                row.append(InlineKeyboardButton(short, callback_data=callback))
-            if len(row) == 3:
-                keyboard.append(row)
-                row = []
-        if row: keyboard.append(row)
+def week_param_of(wk):
+    return wk if wk in ("chys", "znam") else None
+
+def sub_name_of(sb):
+    return f"підгр. {sb}" if sb != "all" else "Вся група"
+
+def week_name_of(wk):
+    return "Чисельник" if wk == "chys" else ("Знаменник" if wk == "znam" else "Всі тижні")
+
+def build_days_keyboard(schedule_data, group, sb, wk):
+    keyboard = []
+    row = []
+    for day_name in TARGET_DAYS:
+        if day_name in schedule_data:
+            short = DAY_SHORT_NAMES.get(day_name, day_name)
+            row.append(InlineKeyboardButton(short, callback_data=encode('fd', group, sb, wk, short)))
+        if len(row) == 3:
+            keyboard.append(row)
+            row = []
+    if row: keyboard.append(row)
+    
+    keyboard.append([InlineKeyboardButton("🔙 Змінити тиждень", callback_data=encode('back_to_weeks', group, sb))])
+    return keyboard
+
+def weeks_keyboard(group, sb, back=False):
+    keyboard = [
+        [InlineKeyboardButton("numerator (Чисельник)", callback_data=encode('week', group, sb, "chys"))],
+        [InlineKeyboardButton("denominator (Знаменник)", callback_data=encode('week', group, sb, "znam"))],
+        [InlineKeyboardButton("Всі тижні", callback_data=encode('week', group, sb, "all"))]
+    ]
+    if back: keyboard.append([InlineKeyboardButton("🔙 Змінити підгрупу", callback_data=encode('back_to_subs', group))])
+    return InlineKeyboardMarkup(keyboard)
+
+# --- ГОТОВІ ЕКРАНИ (кеш) ---
+# Клавіатура днів: None, якщо з цими фільтрами пар немає
+def days_view(schedule, group, sb, wk):
+    key = (group, sb, wk, '__days__')  # окремий ключ: назва дня ніколи не збігається з ним
+    markup = RENDERED.get(key, schedule)
+    if markup is None:
+        with stage('render'):
+            keyboard = build_days_keyboard(schedule.days(sub_param_of(sb), week_param_of(wk)), group, sb, wk)
+            markup = InlineKeyboardMarkup(keyboard) if len(keyboard) > 1 else False
+        RENDERED.put(key, schedule, markup)
+    return markup or None
+
+def day_view(schedule, group, sb, wk, day_full):
+    key = (group, sb, wk, day_full)
+    view = RENDERED.get(key, schedule)
+    if view is None:
+        with stage('render'):
+            lessons = schedule.days(sub_param_of(sb), week_param_of(wk)).get(day_full)
+            text = render_day(day_full, lessons, group) if lessons else "Немає пар."
+            kb = [[InlineKeyboardButton("🔙 До днів тижня", callback_data=encode('back_days', group, sb, wk))]]
+            view = (text, InlineKeyboardMarkup(kb))
+        RENDERED.put(key, schedule, view)
+    return view
+
+async def load_schedule_and_show_days(query, group, sb, wk, retry=False):
+    sub_name = sub_name_of(sb)
+    week_name = week_name_of(wk) if not retry else "Тиждень"
+    if not retry:
+        await edit_message(query, f"⏳ Отримую розклад: <b>{group}</b>, {sub_name}, {week_name}...", parse_mode='HTML')
         
-        keyboard.append([InlineKeyboardButton("🔙 Змінити тиждень", callback_data=f"back_to_weeks_{sub_param}_{group}")])
+    try:
+        POPULARITY.record(group)
+        schedule = await get_group_schedule(group)
+        markup = days_view(schedule, group, sb, wk) if isinstance(schedule, Schedule) else None
 
-        if not keyboard or (len(keyboard) == 1):
-             await query.edit_message_text(f"📭 Розклад для <b>{group}</b> ({sub_name}, {week_name}) порожній.", parse_mode='HTML')
-             return
+        if markup is None:
+            info = render_schedule(schedule, sub_param_of(sb), week_param_of(wk)) if isinstance(schedule, Schedule) else schedule
+            if info and "Info" not in info:
+                # Пари є, але лише в дні поза TARGET_DAYS
+                await edit_message(query, f"📭 Розклад для <b>{group}</b> ({sub_name}, {week_name}) порожній.", parse_mode='HTML')
+                return
+            msg = info.get("Info", "❌ Помилка.") if info else "❌ Помилка."
+            kb = [[InlineKeyboardButton("🔙 Спробувати іншу групу", callback_data=encode('restart'))]]
+            await edit_message(query, msg, reply_markup=InlineKeyboardMarkup(kb), parse_mode='HTML')
+            return
 
-        await query.edit_message_text(
-            f"✅ <b>{group}</b> ({sub_name}, {week_name})\nОберіть день:",
-            reply_markup=InlineKeyboardMarkup(keyboard),
+        await edit_message(query, 
+            f"✅ <b>{group}</b> ({sub_name}, {week_name})\nОберіть день:" + data_as_of(group),
+            reply_markup=markup,
             parse_mode='HTML'
         )
     except Exception as e:
         logger.error(f"Error: {e}")
-        await query.edit_message_text("❌ Помилка.", parse_mode='HTML')
+        await edit_message(query, "❌ Помилка.", parse_mode='HTML')
+
+# --- PUSH ---
+async def send_message(chat_id, text, **kwargs):
+    await TELEGRAM_BOT.send_message(chat_id, text, **kwargs)
+
+# Користувач заблокував бота - розсилку йому більше не шлемо
+async def on_push_error(chat_id, error):
+    if isinstance(error, Forbidden): await drop_subscription(chat_id)
+
+def render_today(schedule, group, sb, wk, now):
+    if not isinstance(schedule, Schedule) or now.weekday() >= len(TARGET_DAYS): return None
+    day_full = TARGET_DAYS[now.weekday()]
+    if not schedule.days(sub_param_of(sb), week_param_of(wk)).get(day_full): return None
+    text, markup = day_view(schedule, group, sb, wk, day_full)
+    return f"☀️ Пари на сьогодні\n{text}", {'reply_markup': markup, 'parse_mode': 'HTML'}
+
+DISPATCHER = Dispatcher(send_message, on_error=on_push_error)
+PUSH_SCHEDULER = PushScheduler(lambda: STATE.get_subscriptions(), get_group_schedule, render_today, DISPATCHER, state=STATE)
+
+REGISTRY.gauge('push_subscriptions', "Chats subscribed to the daily push (as of the last slot)", lambda: PUSH_SCHEDULER.subscribed)
+REGISTRY.gauge('push_queue_size', "Push messages waiting to be sent", lambda: DISPATCHER.queue.qsize())
+REGISTRY.gauge('push_sends_per_second', "Push delivery rate over the last 10 s", DISPATCHER.sends_per_second)
+REGISTRY.gauge('push_last_lag_seconds', "Queue lag of the last delivered push message", lambda: DISPATCHER.last_lag)
 
 # --- BUTTONS ---
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    callback = decode(update.callback_query.data)
+    with traced(f"button {update.callback_query.data}", action=callback.action):
+        await handle_button(update, context, callback)
+
+async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE, callback=None) -> None:
     query = update.callback_query
     chat_id = query.message.chat_id
-    data = query.data
+    if callback is None: callback = decode(query.data)
+    action, group, sb, wk = callback.action, callback.group, callback.sub, callback.week
     await query.answer()
 
-    if data == "restart_full":
-        await query.edit_message_text("Введіть команду `/rozklad ГРУПА` ще раз.", parse_mode='Markdown')
+    if action == "restart":
+        await edit_message(query, "Введіть команду `/rozklad ГРУПА` ще раз.", parse_mode='Markdown')
         return
 
-    if data.startswith("sub_"):
-        try:
-            _, sub_choice, group = data.split("_", 2)
-            keyboard = [
-                [InlineKeyboardButton("numerator (Чисельник)", callback_data=f"week_chys_{sub_choice}_{group}")],
-                [InlineKeyboardButton("denominator (Знаменник)", callback_data=f"week_znam_{sub_choice}_{group}")],
-                [InlineKeyboardButton("Всі тижні", callback_data=f"week_all_{sub_choice}_{group}")]
-            ]
-            sub_name = f"підгр. {sub_choice}" if sub_choice != "all" else "Вся група"
-            await query.edit_message_text(f"🎓 <b>{group}</b> ({sub_name})\n📅 Оберіть тиждень:", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
-        except ValueError: await query.edit_message_text("⚠️ Помилка.")
+    if action == "grp":
+        group = GROUP_INDEX.get(group) or group
+        await select_group(chat_id, group)
+        await edit_message(query, f"🎓 Група: <b>{group}</b>\nОберіть підгрупу:", reply_markup=subgroup_keyboard(group), parse_mode='HTML')
         return
 
-    if data.startswith("week_"):
-        try:
-            parts = data.split("_")
-            week_choice = parts[1]
-            sub_choice = parts[2]
-            group = parts[3]
-
-            sub_param = sub_choice if sub_choice in ["1", "2"] else None
-            sub_name = f"підгр. {sub_choice}" if sub_choice != "all" else "Вся група"
-            week_param = week_choice if week_choice in ["chys", "znam"] else None
-            week_name = "Чисельник" if week_choice == "chys" else ("Знаменник" if week_choice == "znam" else "Всі тижні")
+    if action == "sub":
+        await edit_message(query, f"🎓 <b>{group}</b> ({sub_name_of(sb)})\n📅 Оберіть тиждень:", reply_markup=weeks_keyboard(group, sb), parse_mode='HTML')
+        return
 
-            await load_schedule_and_show_days(query, group, sub_param, sub_name, week_param, week_name)
+    if action == "week":
+        try:
+            await load_schedule_and_show_days(query, group, sb, wk)
         except Exception as e: 
             logger.error(e)
-            await query.edit_message_text("⚠️ Помилка.")
+            await edit_message(query, "⚠️ Помилка.")
         return
 
-    if data.startswith("fd_"):
+    if action == "fd":
         try:
-            parts = data.split("_")
-            day_short = parts[1]
-            group = parts[2]
-            sub_raw = parts[3]
-            week_raw = parts[4]
-
-            sub_param = sub_raw if sub_raw != "all" else None
-            week_param = week_raw if week_raw != "all" else None
-            day_full = next((k for k, v in DAY_SHORT_NAMES.items() if v == day_short), None)
-            
-            cache = SCHEDULE_CACHE.get(chat_id)
-            if cache and cache.get('group') == group and str(cache.get('sub')) == str(sub_param) and str(cache.get('week')) == str(week_param):
-                text = cache['data'].get(day_full, "Немає пар.")
-                back_cb = f"back_days_{group}_{sub_raw}_{week_raw}"
-                kb = [[InlineKeyboardButton("🔙 До днів тижня", callback_data=back_cb)]]
-                await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode='HTML')
+            # Старі кнопки містять перші дві літери назви ("По"), нові - коротку назву ("Пн")
+            day_full = next((k for k, v in DAY_SHORT_NAMES.items() if v == callback.day or k[:2] == callback.day), None)
+            if day_full is None:
+                kb = [[InlineKeyboardButton("🔙 До днів тижня", callback_data=encode('back_days', group, sb, wk))]]
+                await edit_message(query, "⚠️ Невідомий день.", reply_markup=InlineKeyboardMarkup(kb))
                 return
             
-            sub_name = f"підгр. {sub_raw}" if sub_raw != "all" else "Вся група"
-            week_name = "Чисельник" if week_raw == "chys" else ("Знаменник" if week_raw == "znam" else "Всі тижні")
-            
-            await query.edit_message_text(f"⚠️ Оновлюю...", parse_mode='HTML')
-            await load_schedule_and_show_days(query, group, sub_param, sub_name, week_param, week_name, retry=True)
+            if group_key(group) not in GROUP_CACHE:
+                await edit_message(query, f"⚠️ Оновлюю...", parse_mode='HTML')
+
+            schedule = await get_group_schedule(group)
+            if not isinstance(schedule, Schedule):
+                kb = [[InlineKeyboardButton("🔙 Спробувати іншу групу", callback_data=encode('restart'))]]
+                await edit_message(query, schedule.get("Info", "❌ Помилка."), reply_markup=InlineKeyboardMarkup(kb), parse_mode='HTML')
+                return
+
+            text, markup = day_view(schedule, group, sb, wk, day_full)
+            await edit_message(query, text + data_as_of(group), reply_markup=markup, parse_mode='HTML')
 
         except Exception as e:
             logger.error(f"FD Error: {e}")
-            await query.edit_message_text("⚠️ Помилка даних.")
+            await edit_message(query, "⚠️ Помилка даних.")
         return
 
-    if data.startswith("back_days_"):
+    if action == "back_days":
         try:
-            parts = data.split("_")
-            group = parts[2]
-            sub_raw = parts[3]
-            week_raw = parts[4]
-            
-            cache = SCHEDULE_CACHE.get(chat_id)
-            if not cache:
-                 sub_param = sub_raw if sub_raw != "all" else None
-                 sub_name = f"підгр. {sub_raw}" if sub_raw != "all" else "Вся група"
-                 week_param = week_raw if week_raw != "all" else None
-                 week_name = "Тиждень"
-                 await load_schedule_and_show_days(query, group, sub_param, sub_name, week_param, week_name, retry=True)
+            if group_key(group) not in GROUP_CACHE:
+                 await load_schedule_and_show_days(query, group, sb, wk, retry=True)
                  return
 
-            keyboard = []
-            row = []
-            for day_name in TARGET_DAYS:
-                if day_name in cache['data']:
-                    short = DAY_SHORT_NAMES.get(day_name, day_name)
-                    callback = f"fd_{day_name[:2]}_{group}_{sub_raw}_{week_raw}"
-                    row.append(InlineKeyboardButton(short, callback_data=callback))
-                if len(row) == 3:
-                    keyboard.append(row)
-                    row = []
-            if row: keyboard.append(row)
-            
-            keyboard.append([InlineKeyboardButton("🔙 Змінити тиждень", callback_data=f"back_to_weeks_{sub_raw}_{group}")])
-            
-            await query.edit_message_text("📅 Оберіть день:", reply_markup=InlineKeyboardMarkup(keyboard))
+            schedule = await get_group_schedule(group)
+            await edit_message(query, "📅 Оберіть день:", reply_markup=days_view(schedule, group, sb, wk))
         except Exception as e:
              logger.error(e)
-             await query.edit_message_text("Error back days")
+             await edit_message(query, "Error back days")
         return
 
-    if data.startswith("back_to_weeks_"):
-        try:
-            parts = data.split("_")
-            sub_choice = parts[3]
-            group = parts[4]
-            
-            keyboard = [
-                [InlineKeyboardButton("numerator (Чисельник)", callback_data=f"week_chys_{sub_choice}_{group}")],
-                [InlineKeyboardButton("denominator (Знаменник)", callback_data=f"week_znam_{sub_choice}_{group}")],
-                [InlineKeyboardButton("Всі тижні", callback_data=f"week_all_{sub_choice}_{group}")]
-            ]
-            keyboard.append([InlineKeyboardButton("🔙 Змінити підгрупу", callback_data=f"back_to_subs_{group}")])
-            await query.edit_message_text("📅 Оберіть тиждень:", reply_markup=InlineKeyboardMarkup(keyboard))
-        except Exception as e: logger.error(e)
+    if action == "back_to_weeks":
+        await edit_message(query, "📅 Оберіть тиждень:", reply_markup=weeks_keyboard(group, sb, back=True))
         return
 
-    if data.startswith("back_to_subs_"):
-        group = data.split("_")[3]
-        kb = [
-            [InlineKeyboardButton("👤 1 підгрупа", callback_data=f"sub_1_{group}"),
-             InlineKeyboardButton("👤 2 підгрупа", callback_data=f"sub_2_{group}")],
-            [InlineKeyboardButton("👥 Вся група", callback_data=f"sub_all_{group}")]
-        ]
-        await query.edit_message_text(f"🎓 Група: <b>{group}</b>\nОберіть підгрупу:", reply_markup=InlineKeyboardMarkup(kb), parse_mode='HTML')
+    if action == "back_to_subs":
+        await edit_message(query, f"🎓 Група: <b>{group}</b>\nОберіть підгрупу:", reply_markup=subgroup_keyboard(group), parse_mode='HTML')
 
 # --- FIX: РУЧНИЙ ЗАПУСК БОТА ---
 async def start_bot_manual():
@@ -251,18 +491,49 @@ async def start_bot_manual():
         logger.error("❌ NO TOKEN")
         return
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Розклади з диска читаються на вимогу, тут - лише індекс і групи користувачів
+    user_groups = STORE.open().user_groups()
+    await STATE.seed_user_groups(user_groups)
+    # Зі спільним станом (Redis) підписки живуть там; локальна копія - лише для однієї репліки
+    if not STATE.shared:
+        for chat_id, subscription in STORE.subscriptions().items(): await STATE.set_subscription(chat_id, *subscription)
+    for group, _, _ in STORE.keys(): GROUP_INDEX.add(group)
+    group_names = STORE.group_names()
+    if group_names: GROUP_INDEX.seed(group_names)
+    logger.info(f"Індекс груп: {len(GROUP_INDEX)} назв")
+
+    # Оновлення обробляються паралельно (до UPDATE_CONCURRENCY); у режимі вебхука Updater не потрібен
+    builder = Application.builder().token(TELEGRAM_TOKEN).concurrent_updates(UPDATE_CONCURRENCY)
+    if WEBHOOK_URL: builder = builder.updater(None)
+    application = builder.build()
     
     # Додаємо хендлери
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("rozklad", get_rozklad))
     application.add_handler(CommandHandler("info", info))
+    application.add_handler(CommandHandler("subscribe", subscribe))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
     application.add_handler(CommandHandler("support", support))
     application.add_handler(CallbackQueryHandler(button_handler))
 
     # Ручна ініціалізація та запуск
     await application.initialize()
     await application.start()
-    await application.updater.start_polling() # Запускаємо отримання оновлень
+    if WEBHOOK_URL:
+        global WEBHOOK
+        WEBHOOK = await WebhookServer(application).start()
+    else:
+        await application.updater.start_polling() # Запускаємо отримання оновлень
+
+    # Фонове оновлення популярних груп
+    for group in user_groups.values(): POPULARITY.record(group)
+    PREWARMER.start()
+    STORE.start()
+
+    # Щоденна розсилка
+    global TELEGRAM_BOT
+    TELEGRAM_BOT = application.bot
+    DISPATCHER.start()
+    PUSH_SCHEDULER.start()
     
-    logger.info("🚀 Бот успішно запущено (Manual Mode)!")
+    logger.info(f"🚀 Бот успішно запущено ({'Webhook' if WEBHOOK_URL else 'Manual'} Mode)!")
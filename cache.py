@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+CACHE_TTL = int(os.environ.get('SCHEDULE_CACHE_TTL', 6 * 60 * 60))
+CACHE_MAX_ENTRIES = int(os.environ.get('SCHEDULE_CACHE_MAX_ENTRIES', 500))
+RENDER_CACHE_MAX_ENTRIES = int(os.environ.get('RENDER_CACHE_MAX_ENTRIES', 5000))
+
+
+# --- СПІЛЬНИЙ КЕШ РОЗКЛАДІВ ---
+# Один запис на (група, семестр, тривалість) для всього процесу.
+# LRU + TTL, а одночасні запити на одну групу чекають один і той самий fetch.
+class ScheduleCache:
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}            # key -> asyncio.Future
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self._clock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, ttl=None):
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            logger.debug(f"Cache evict: {old_key}")
+
+    # Значення без урахування TTL і без впливу на статистику/LRU (для умовних запитів)
+    def peek(self, key):
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    # Скільки секунд лишилось до кінця TTL (None - запису немає або він прострочений)
+    def ttl_remaining(self, key):
+        entry = self._entries.get(key)
+        if entry is None: return None
+        remaining = entry[0] - self._clock()
+        return remaining if remaining > 0 else None
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    # Fetch іде окремою задачею, яку всі (і перший) чекають через shield: скасування одного
+    # запиту (напр. користувач пішов) не скасовує fetch для решти.
+    async def get_or_fetch(self, key, fetch, cacheable=None):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._fetch(key, fetch, cacheable))
+            # Щоб не було "Task exception was never retrieved", якщо всі, хто чекав, скасовані
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, fetch, cacheable):
+        try:
+            value = await fetch()
+            if value is not None and (cacheable is None or cacheable(value)):
+                self.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'coalesced': self.coalesced,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# --- КЕШ ГОТОВИХ ЕКРАНІВ ---
+# (група, підгрупа, тиждень, день) -> текст і клавіатура. Запис дійсний, поки розклад - той самий
+# об'єкт Schedule (незмінена сторінка повертає попередній об'єкт); при зміні розкладу група скидається.
+class RenderCache:
+    def __init__(self, max_entries=RENDER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (schedule, value)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, schedule):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is not schedule:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, schedule, value):
+        self._entries[key] = (schedule, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_group(self, group):
+        for key in [k for k in self._entries if k[0] == group]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
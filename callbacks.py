@@ -0,0 +1,89 @@
+# --- CALLBACK DATA ---
+# Формат v1: "v1|<дія>|<група>|<підгрупа>|<тиждень>|<день>" (зайві поля відкидаються).
+# Роздільник "|" у значеннях заборонений, тож "_" у назві більше нічого не ламає.
+# Кнопки в уже надісланих повідомленнях мають старий формат через "_" - їх теж розбираємо.
+VERSION = "v1"
+SEP = "|"
+MAX_BYTES = 64  # ліміт Telegram на callback_data
+
+# дія -> короткий код (callback_data обмежено 64 байтами)
+ACTIONS = {
+    'restart': 'rs',
+    'grp': 'g',
+    'sub': 's',
+    'week': 'w',
+    'fd': 'fd',
+    'back_days': 'bd',
+    'back_to_weeks': 'bw',
+    'back_to_subs': 'bs',
+}
+CODES = {code: action for action, code in ACTIONS.items()}
+FIELDS = ('group', 'sub', 'week', 'day')
+
+
+class Callback:
+    __slots__ = ('action', 'group', 'sub', 'week', 'day')
+
+    def __init__(self, action, group=None, sub=None, week=None, day=None):
+        self.action = action
+        self.group = group
+        self.sub = sub
+        self.week = week
+        self.day = day
+
+    def __repr__(self):
+        fields = "".join(f", {name}={getattr(self, name)!r}" for name in FIELDS if getattr(self, name) is not None)
+        return f"Callback({self.action!r}{fields})"
+
+
+# ValueError, якщо значення містить роздільник або результат довший за MAX_BYTES
+def encode(action, group=None, sub=None, week=None, day=None):
+    parts = [VERSION, ACTIONS[action]]
+    values = [group, sub, week, day]
+    while values and values[-1] is None: values.pop()
+    values = ["" if v is None else str(v) for v in values]
+    if any(SEP in v for v in values): raise ValueError(f"{SEP!r} in callback value: {values}")
+    parts.extend(values)
+    data = SEP.join(parts)
+    if len(data.encode('utf-8')) > MAX_BYTES: raise ValueError(f"callback_data over {MAX_BYTES} bytes: {data}")
+    return data
+
+
+def decode(data):
+    if not data: return Callback('unknown')
+    if data.startswith(VERSION + SEP):
+        parts = data.split(SEP)
+        action = CODES.get(parts[1], 'unknown') if len(parts) > 1 else 'unknown'
+        values = [v or None for v in parts[2:2 + len(FIELDS)]]
+        return Callback(action, *values)
+    try:
+        return decode_legacy(data)
+    except ValueError:
+        return Callback('unknown')
+
+
+# Старий формат: група стоїть посередині, тож поля навколо неї беремо з країв
+def decode_legacy(data):
+    if data == "restart_full":
+        return Callback('restart')
+    if data.startswith("back_to_weeks_"):
+        sub, _, group = data[len("back_to_weeks_"):].partition("_")
+        return Callback('back_to_weeks', group, sub)
+    if data.startswith("back_to_subs_"):
+        return Callback('back_to_subs', data[len("back_to_subs_"):])
+    if data.startswith("back_days_"):
+        group, sub, week = data[len("back_days_"):].rsplit("_", 2)
+        return Callback('back_days', group, sub, week)
+    if data.startswith("grp_"):
+        return Callback('grp', data[len("grp_"):])
+    if data.startswith("sub_"):
+        sub, _, group = data[len("sub_"):].partition("_")
+        return Callback('sub', group, sub)
+    if data.startswith("week_"):
+        week, sub, group = data[len("week_"):].split("_", 2)
+        return Callback('week', group, sub, week)
+    if data.startswith("fd_"):
+        day, rest = data[len("fd_"):].split("_", 1)
+        group, sub, week = rest.rsplit("_", 2)
+        return Callback('fd', group, sub, week, day)
+    return Callback('unknown')
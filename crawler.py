@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# Масове завантаження розкладів усіх груп у сховище (store.py).
+#
+#   python crawler.py groups.txt                   # одна група на рядок ("-" - stdin)
+#   python crawler.py АВ-11 КН-21 --rate 2 --concurrency 8 --workers 4
+#
+# Запити йдуть паралельно під спільним rate limit (UpstreamClient), невдалі повторюються
+# з експоненційною затримкою, BeautifulSoup працює в пулі процесів. Прогрес пишеться у
+# файл стану, тож перерваний запуск можна продовжити тією ж командою. Повний список груп
+# (з фільтра на сторінках або, з --group-list, сам список) зберігається для індексу бота.
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fetcher import UpstreamClient, UpstreamError, fetch_schedule
+from parser import BASE_URL, Schedule
+from store import ScheduleStore, STORE_PATH
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+CRAWL_STATE_PATH = os.environ.get('CRAWL_STATE_PATH', 'crawl.state')
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+# --- СТАН (append-only) ---
+# Рядок на групу: "<група>\t<ok|not_found|failed>". failed при продовженні пробуємо знову.
+def load_state(path):
+    done = {}
+    if not os.path.exists(path): return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            group, _, status = line.rstrip('\n').partition('\t')
+            if group: done[group] = status
+    return done
+
+
+class Crawler:
+    def __init__(self, client, store, executor, semester="1", duration="1", concurrency=8, retries=3,
+                 backoff=2.0, max_age=None, state_path=CRAWL_STATE_PATH, report_every=10.0):
+        self.client = client
+        self.store = store
+        self.executor = executor
+        self.semester = semester
+        self.duration = duration
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_age = max_age
+        self.state_path = state_path
+        self.report_every = report_every
+        self.ok = 0
+        self.not_found = 0
+        self.failed = 0
+        self.skipped = 0
+        self.retried = 0
+        self.started = None
+        self._state = None
+
+    def pending(self, groups, resume=True):
+        done = load_state(self.state_path) if resume else {}
+        now = time.time()
+        result = []
+        for group in dict.fromkeys(groups):
+            if done.get(group) in ('ok', 'not_found'):
+                self.skipped += 1
+                continue
+            fetched_at = self.store.fetched_at((group, self.semester, self.duration))
+            if self.max_age and fetched_at and now - fetched_at < self.max_age:
+                self.skipped += 1
+                continue
+            result.append(group)
+        return result
+
+    def _mark(self, group, status):
+        self._state.write(f"{group}\t{status}\n")
+        self._state.flush()
+
+    async def crawl_group(self, group):
+        for attempt in range(self.retries + 1):
+            try:
+                return await fetch_schedule(self.client, group, self.semester, executor=self.executor, raise_errors=True)
+            except UpstreamError as e:
+                if attempt == self.retries or (e.status is not None and e.status not in RETRYABLE_STATUSES):
+                    raise
+                self.retried += 1
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                logger.info(f"Retry {group} in {delay:.1f}s ({e})")
+                await asyncio.sleep(delay)
+
+    async def worker(self, queue):
+        while True:
+            group = await queue.get()
+            try:
+                result = await self.crawl_group(group)
+                if isinstance(result, Schedule):
+                    self.store.put_schedule((group, self.semester, self.duration), result)
+                    self.ok += 1
+                    self._mark(group, 'ok')
+                else:
+                    self.not_found += 1
+                    self._mark(group, 'not_found')
+            except Exception as e:
+                self.failed += 1
+                self._mark(group, 'failed')
+                logger.warning(f"Crawl {group} failed: {e}")
+            finally:
+                queue.task_done()
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        done = self.ok + self.not_found + self.failed
+        return done / elapsed if elapsed > 0 else 0.0
+
+    def report(self, total):
+        done = self.ok + self.not_found + self.failed
+        logger.info(f"Crawl: {done}/{total} groups, ok={self.ok} not_found={self.not_found} failed={self.failed} "
+                    f"retries={self.retried} skipped={self.skipped}, {self.throughput():.2f} groups/s")
+
+    async def _reporter(self, total):
+        while True:
+            await asyncio.sleep(self.report_every)
+            self.report(total)
+
+    async def run(self, groups, resume=True):
+        todo = self.pending(groups, resume)
+        queue = asyncio.Queue()
+        for group in todo: queue.put_nowait(group)
+
+        self.started = time.monotonic()
+        with open(self.state_path, 'a' if resume else 'w', encoding='utf-8') as self._state:
+            workers = [asyncio.create_task(self.worker(queue)) for _ in range(self.concurrency)]
+            reporter = asyncio.create_task(self._reporter(len(todo)))
+            try:
+                await queue.join()
+            finally:
+                for task in workers + [reporter]: task.cancel()
+                await asyncio.gather(*workers, reporter, return_exceptions=True)
+                self.store.flush()
+        self.report(len(todo))
+        return self
+
+
+def read_groups(sources):
+    groups = []
+    for source in sources:
+        if source == '-':
+            groups.extend(line.strip() for line in sys.stdin)
+        elif os.path.isfile(source):
+            with open(source, encoding='utf-8') as f:
+                groups.extend(line.strip() for line in f)
+        else:
+            groups.append(source)
+    return [g for g in groups if g and not g.startswith('#')]
+
+
+async def crawl(args):
+    groups = read_groups(args.groups)
+    client = UpstreamClient(base_url=args.base_url, concurrency=args.concurrency, rate=args.rate, burst=args.burst)
+    store = ScheduleStore(args.store).open()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            crawler = Crawler(client, store, executor, semester=args.semester, concurrency=args.concurrency,
+                              retries=args.retries, backoff=args.backoff, max_age=args.max_age,
+                              state_path=args.state, report_every=args.report_every)
+            await crawler.run(groups, resume=not args.fresh)
+        # Повний список груп для індексу бота: фільтр зі сторінок сайту або сам список crawl
+        names = groups if args.group_list else client.group_names
+        if names: store.set_group_names(names)
+    finally:
+        await client.close()
+        store.close()
+    return crawler
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Crawl schedules for many groups into the schedule store")
+    ap.add_argument('groups', nargs='+', help="group names, files with one group per line, or - for stdin")
+    ap.add_argument('--semester', default="1")
+    ap.add_argument('--concurrency', type=int, default=8, help="parallel fetches")
+    ap.add_argument('--rate', type=float, default=2.0, help="global upstream requests per second")
+    ap.add_argument('--burst', type=int, default=4)
+    ap.add_argument('--workers', type=int, default=os.cpu_count(), help="parser processes")
+    ap.add_argument('--retries', type=int, default=3)
+    ap.add_argument('--backoff', type=float, default=2.0, help="first retry delay, seconds")
+    ap.add_argument('--max-age', type=float, default=None, help="skip groups stored less than N seconds ago")
+    ap.add_argument('--store', default=STORE_PATH)
+    ap.add_argument('--state', default=CRAWL_STATE_PATH, help="progress file used to resume")
+    ap.add_argument('--fresh', action='store_true', help="ignore the progress file and start over")
+    ap.add_argument('--group-list', action='store_true',
+                    help="the groups given are the full list (seeds the bot's group index instead of the site's filter)")
+    ap.add_argument('--base-url', default=BASE_URL, help="upstream base URL (e.g. a local stub server)")
+    ap.add_argument('--report-every', type=float, default=10.0)
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    crawler = asyncio.run(crawl(args))
+    return 0 if crawler.failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlencode
+
+import aiohttp
+
+from metrics import REGISTRY, stage, run_in_executor, UPSTREAM_RESPONSES
+from parser import BASE_URL, SCRAPER_API_KEY, parse_page, extract_view_content, extract_group_names, is_blank_region, content_hash
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+SCRAPER_API_URL = 'http://api.scraperapi.com'
+UPSTREAM_CONCURRENCY = int(os.environ.get('UPSTREAM_CONCURRENCY', 4))   # одночасних з'єднань на хост
+UPSTREAM_RATE = float(os.environ.get('UPSTREAM_RATE', 1.0))             # запитів за секунду
+UPSTREAM_BURST = int(os.environ.get('UPSTREAM_BURST', 3))
+DIRECT_TIMEOUT = 15
+SCRAPER_TIMEOUT = 60
+# Маршрути в порядку пріоритету; scraperapi - лише якщо є ключ, і тоді першим:
+# пряма сторінка буває JS-челенджем, який рендерить лише ScraperAPI
+UPSTREAM_ROUTES = [r for r in os.environ.get('UPSTREAM_ROUTES', 'scraperapi,direct').split(',') if r]
+# Якщо маршрут не відповів за стільки секунд після відправки, паралельно запускається наступний
+HEDGE_DELAY = float(os.environ.get('HEDGE_DELAY', 3))
+BREAKER_FAILURES = int(os.environ.get('BREAKER_FAILURES', 5))   # помилок поспіль до розмикання
+BREAKER_RESET = float(os.environ.get('BREAKER_RESET', 30))      # секунд до пробного запиту
+# 1 - завжди тягнути обидві половини семестру паралельно (інакше - лише для груп, де була друга)
+FETCH_BOTH_DURATIONS = os.environ.get('FETCH_BOTH_DURATIONS', '0') == '1'
+NOT_FOUND_MARK = "не знайдено"
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Referer': BASE_URL + '/',
+}
+
+
+# Помилка upstream (мережа або HTTP-статус), коли викликачу потрібен виняток, а не {"Info": ...}
+class UpstreamError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+# --- RATE LIMIT ---
+class TokenBucket:
+    def __init__(self, rate=UPSTREAM_RATE, capacity=UPSTREAM_BURST, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+# --- CIRCUIT BREAKER ---
+# closed -> (BREAKER_FAILURES помилок поспіль) -> open: запити відхиляються одразу, без таймаутів
+# -> (через BREAKER_RESET) -> half_open: пропускається один пробний запит -> closed або знову open.
+CIRCUIT_STATE = REGISTRY.gauge('upstream_circuit_state', "Circuit breaker state by route (0 closed, 1 half-open, 2 open)")
+CIRCUIT_REJECTED = REGISTRY.counter('upstream_circuit_rejected_total', "Requests rejected by an open circuit, by route")
+HEDGED_REQUESTS = REGISTRY.counter('upstream_hedged_total', "Requests sent to a fallback route while the primary was pending")
+STATE_CODES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        CIRCUIT_STATE.set(0, route=name)
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(f"Circuit {self.name}: {self.state} -> {state}")
+            self.state = state
+            CIRCUIT_STATE.set(STATE_CODES[state], route=self.name)
+
+    def allow(self):
+        if self.state == 'open':
+            if self._clock() - self.opened_at < self.reset_timeout:
+                CIRCUIT_REJECTED.inc(route=self.name)
+                return False
+            self._set_state('half_open')
+            self._probing = False
+        if self.state == 'half_open':
+            if self._probing:
+                CIRCUIT_REJECTED.inc(route=self.name)
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._set_state('closed')
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+            self._set_state('open')
+
+    # Пробний запит скасовано (виграв інший маршрут) - наступний може спробувати знову
+    def release(self):
+        self._probing = False
+
+
+# Мінімальна обгортка, щоб код працював з відповіддю як з requests.Response
+class Response:
+    __slots__ = ('status_code', 'text', 'headers')
+
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+# Придатна відповідь - 304 або сторінка з блоком view-content чи справжнє "не знайдено";
+# 200 із JS-челенджем або заглушкою перемогти не може
+def is_usable(response):
+    if response.status_code == 304: return True
+    if response.status_code != 200: return False
+    return extract_view_content(response.text) is not None or NOT_FOUND_MARK in response.text.lower()
+
+
+# --- КЛІЄНТ ---
+# Одна keep-alive сесія на весь застосунок; ліміт з'єднань на хост + token bucket
+# замість time.sleep перед кожним запитом.
+class UpstreamClient:
+    def __init__(self, base_url=BASE_URL, scraper_api_key=SCRAPER_API_KEY, scraper_api_url=SCRAPER_API_URL,
+                 concurrency=UPSTREAM_CONCURRENCY, rate=UPSTREAM_RATE, burst=UPSTREAM_BURST, limiter=None, routes=None):
+        self.base_url = base_url
+        self.scraper_api_key = scraper_api_key
+        self.scraper_api_url = scraper_api_url
+        self.concurrency = concurrency
+        # limiter - будь-що з async acquire() (напр. state.SharedRateLimiter для кількох реплік)
+        self.limiter = limiter or TokenBucket(rate, burst)
+        self._session = None
+        # Для умовних запитів і виявлення змін
+        self.validators = {}      # (group, semester, duration) -> {'ETag': ..., 'Last-Modified': ...}
+        self.content_hashes = {}  # (group, semester) -> (duration, хеш блоку view-content)
+        self.not_modified = 0
+        self.unchanged = 0
+        self.group_names = None   # повний список груп із фільтра першої ж сторінки (для GroupIndex.seed)
+        self.routes = [r for r in routes or UPSTREAM_ROUTES if r != 'scraperapi' or scraper_api_key] or ['direct']
+        self.breakers = {route: CircuitBreaker(route) for route in self.routes}
+        # Кожен маршрут - зі своїм бюджетом: limiter береже сам сайт (direct), у ScraperAPI - власний,
+        # тож хедж не з'їдає токени основного маршруту
+        self.limiters = {route: self.limiter if route == 'direct' else TokenBucket(rate, burst) for route in self.routes}
+        self.hedge_delay = HEDGE_DELAY
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, headers=HEADERS)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    # Маршрути по черзі з хеджуванням: якщо попередній не відповів за hedge_delay після відправки
+    # (або вже впав), запускається наступний; перемагає перша придатна відповідь (is_usable), решта скасовуються.
+    # Якщо вдалих немає - повертається остання погана відповідь або кидається остання помилка.
+    async def make_request(self, group_name, semester, duration, conditional=False):
+        pending = set()
+        failures = []
+        try:
+            for i, route in enumerate(self.routes):
+                if not self.breakers[route].allow():
+                    failures.append(UpstreamError(f"{route}: circuit open"))
+                    continue
+                if pending: HEDGED_REQUESTS.inc(route=route)
+                sent = asyncio.Event()
+                task = asyncio.ensure_future(self._route_request(route, group_name, semester, duration, conditional, sent))
+                pending.add(task)
+                last = i == len(self.routes) - 1
+                if not last: await self._wait_sent(task, sent)
+                response = await self._first_good(pending, failures, None if last else self.hedge_delay)
+                if response is not None: return response
+            response = await self._first_good(pending, failures, None)
+            if response is not None: return response
+        finally:
+            for task in pending: task.cancel()
+
+        for failure in reversed(failures):
+            if isinstance(failure, Response): return failure
+        raise failures[-1] if failures else UpstreamError("no upstream routes")
+
+    # Таймер хеджування стартує, лише коли запит отримав токен і пішов у мережу:
+    # очікування ліміту - не повільність upstream
+    @staticmethod
+    async def _wait_sent(task, sent):
+        waiter = asyncio.ensure_future(sent.wait())
+        try:
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+
+    @staticmethod
+    async def _first_good(pending, failures, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while pending:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0: return None
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done: return None
+            for task in done:
+                pending.discard(task)
+                try:
+                    response = task.result()
+                except Exception as e:
+                    failures.append(e)
+                    continue
+                if is_usable(response): return response
+                failures.append(response)
+        return None
+
+    async def _route_request(self, route, group_name, semester, duration, conditional, sent=None):
+        breaker = self.breakers[route]
+        try:
+            response = await self._request(route, group_name, semester, duration, conditional, sent)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        # 404 - відповідь сервера, а не збій маршруту; 200 без розкладу (челендж) - збій
+        if is_usable(response) or response.status_code == 404: breaker.record_success()
+        else: breaker.record_failure()
+        return response
+
+    async def _request(self, route, group_name, semester, duration, conditional=False, sent=None):
+        schedule_url = f"{self.base_url}/students_schedule"
+        params = {
+            "studygroup_abbrname": group_name,
+            "semestr": semester,
+            "semestrduration": duration
+        }
+        session = self._get_session()
+        validator_key = (group_name, semester, duration)
+        await self.limiters.get(route, self.limiter).acquire()
+
+        if route == 'scraperapi':
+            payload = {
+                'api_key': self.scraper_api_key,
+                'url': schedule_url + '?' + urlencode(params),
+                'render': 'true' # Важливо для JS
+            }
+            url, timeout, headers = self.scraper_api_url, SCRAPER_TIMEOUT, None
+        else:
+            url, payload, timeout = schedule_url, params, DIRECT_TIMEOUT
+            headers = {}
+            known = self.validators.get(validator_key, {}) if conditional else {}
+            if 'ETag' in known: headers['If-None-Match'] = known['ETag']
+            if 'Last-Modified' in known: headers['If-Modified-Since'] = known['Last-Modified']
+
+        if sent is not None: sent.set()
+        with stage('fetch', route=route):
+            try:
+                async with session.get(url, params=payload, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    UPSTREAM_RESPONSES.inc(route=route, status=response.status)
+                    if response.status == 304:
+                        self.not_modified += 1
+                        return Response(304, "", response.headers.copy())
+                    result = Response(response.status, await response.text(), response.headers.copy())
+            except Exception:
+                UPSTREAM_RESPONSES.inc(route=route, status='error')
+                raise
+
+        if result.status_code == 200:
+            validators = {k: result.headers[k] for k in ('ETag', 'Last-Modified') if k in result.headers}
+            if validators: self.validators[validator_key] = validators
+            else: self.validators.pop(validator_key, None)
+        return result
+
+
+# --- АСИНХРОННИЙ ЗАПИТ РОЗКЛАДУ ---
+# Той самий алгоритм, що й parser.fetch_schedule: мережа в event loop,
+# парсинг (parser.parse_page) - у пулі потоків.
+# previous - відомий розклад групи: якщо сервер відповів 304 або хеш блоку view-content
+# не змінився, він повертається як є (той самий об'єкт) без парсингу.
+# executor - куди віддати парсинг (None - пул потоків за замовчуванням);
+# raise_errors - кидати UpstreamError замість {"Info": ...} (для повторних спроб).
+async def fetch_schedule(client, group_name, semester="1", previous=None, executor=None, raise_errors=False):
+    known = client.content_hashes.get((group_name, semester)) if previous is not None else None
+    # Якщо минулого разу розклад був у другій половині семестру, обидві половини тягнемо паралельно
+    second = None
+    if FETCH_BOTH_DURATIONS or (known is not None and known[0] == "2"):
+        second = asyncio.ensure_future(client.make_request(group_name, semester, "2", conditional=known is not None))
+        second.add_done_callback(lambda t: t.cancelled() or t.exception())
+    try:
+        return await _fetch_schedule(client, group_name, semester, previous, known, second, executor, raise_errors)
+    finally:
+        if second is not None and not second.done(): second.cancel()
+
+async def _fetch_schedule(client, group_name, semester, previous, known, second, executor, raise_errors):
+    loop = asyncio.get_running_loop()
+    try:
+        response = await client.make_request(group_name, semester, "1", conditional=known is not None)
+    except Exception as e:
+        if raise_errors: raise UpstreamError(f"{group_name}: {e!r}") from e
+        logger.warning(f"Upstream error ({group_name}): {e!r}")
+        return {"Info": "❌ Помилка з'єднання."}
+    if response.status_code == 304 and known and known[0] == "1": return previous
+    if response.status_code not in (200, 304):
+        if raise_errors: raise UpstreamError(f"{group_name}: HTTP {response.status_code}", response.status_code)
+        return {"Info": f"❌ HTTP Error {response.status_code}"}
+
+    # 304 на першу половину, коли розклад брався з другої: перша досі порожня
+    text = response.text if response.status_code == 200 else ""
+    if client.group_names is None and text: client.group_names = extract_group_names(text)
+    region = extract_view_content(text)
+    duration = "1"
+
+    if is_blank_region(region):
+        try:
+            response_2 = await (second or client.make_request(group_name, semester, "2", conditional=known is not None))
+            if response_2.status_code == 304 and known and known[0] == "2": return previous
+            if response_2.status_code == 200:
+                region_2 = extract_view_content(response_2.text)
+                if region_2 is not None:
+                    text, region, duration = response_2.text, region_2, "2"
+        except Exception as e:
+            logger.warning(f"Upstream error ({group_name}, duration=2): {e!r}")
+
+    digest = content_hash(region) if region else None
+    if digest and known == (duration, digest):
+        client.unchanged += 1
+        return previous
+
+    with stage('parse'):
+        schedule = await run_in_executor(loop, parse_page, text, group_name, region, executor=executor)
+    if digest and not isinstance(schedule, dict):
+        client.content_hashes[(group_name, semester)] = (duration, digest)
+    return schedule
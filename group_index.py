@@ -0,0 +1,109 @@
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+MAX_SUGGESTIONS = 6
+
+_END = '$'
+DASHES = str.maketrans({'–': '-', '—': '-', '_': '-', ' ': ''})
+
+
+def normalize(name):
+    return (name or "").strip().upper().translate(DASHES)
+
+
+# --- ІНДЕКС НАЗВ ГРУП ---
+# Префіксне дерево: пошук за префіксом і за відстанню Левенштейна (обхід дерева з
+# обрізанням гілок, де мінімум рядка DP вже більший за допустиму відстань).
+# Повним індекс стає лише після seed() з повного списку груп (select на сторінці розкладу
+# або список crawl); до того невідома назва може бути просто ще не баченою.
+class GroupIndex:
+    def __init__(self, names=()):
+        self._root = {}
+        self._size = 0
+        self._complete = False
+        for name in names: self.add(name)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, name):
+        node = self._find(normalize(name))
+        return node is not None and _END in node
+
+    def is_complete(self):
+        return self._complete
+
+    def seed(self, names):
+        for name in names: self.add(name)
+        self._complete = True
+        logger.info(f"Group index seeded: {self._size} names")
+
+    # Назва в індексі (нормалізована, напр. "АВ_11" -> "АВ-11") або None
+    def get(self, name):
+        node = self._find(normalize(name))
+        return node.get(_END) if node is not None else None
+
+    def add(self, name):
+        key = normalize(name)
+        if not key: return
+        node = self._root
+        for ch in key:
+            node = node.setdefault(ch, {})
+        if _END not in node:
+            self._size += 1
+        node[_END] = key
+
+    def _find(self, key):
+        node = self._root
+        for ch in key:
+            node = node.get(ch)
+            if node is None: return None
+        return node
+
+    def prefix(self, prefix, limit=MAX_SUGGESTIONS):
+        node = self._find(normalize(prefix))
+        if node is None: return []
+        # Обхід у ширину: спершу найкоротші доповнення
+        result = []
+        queue = deque([node])
+        while queue and len(result) < limit:
+            node = queue.popleft()
+            if _END in node: result.append(node[_END])
+            queue.extend(child for ch, child in sorted(node.items()) if ch != _END)
+        return result
+
+    def fuzzy(self, query, max_distance=2, limit=MAX_SUGGESTIONS):
+        key = normalize(query)
+        if not key: return []
+        first_row = list(range(len(key) + 1))
+        found = []
+
+        size = len(key)
+        stack = [(child, ch, first_row) for ch, child in self._root.items() if ch != _END]
+        while stack:
+            node, ch, prev_row = stack.pop()
+            row = [prev_row[0] + 1]
+            for i in range(size):
+                row.append(min(row[i] + 1, prev_row[i + 1] + 1, prev_row[i] + (key[i] != ch)))
+            if row[-1] <= max_distance and _END in node:
+                found.append((row[-1], node[_END]))
+            if min(row) <= max_distance:
+                stack.extend((child, next_ch, row) for next_ch, child in node.items() if next_ch != _END)
+        found.sort()
+        return [name for _, name in found[:limit]]
+
+    # Точний збіг -> [назва]; інакше спершу доповнення за префіксом, потім схожі назви
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        key = normalize(query)
+        if key in self: return [key]
+        result = self.prefix(key, limit)
+        # Відстань 2 - лише якщо на відстані 1 нічого немає (обхід з меншим порогом значно дешевший)
+        for distance in (1, 2):
+            if len(result) >= limit: break
+            for name in self.fuzzy(key, distance, limit):
+                if name not in result: result.append(name)
+            if result: break
+        return result[:limit]
@@ -0,0 +1,212 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 3))
+TRACE_SLOW_REQUESTS = os.environ.get('TRACE_SLOW_REQUESTS', '1') == '1'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()  # /metrics читається з потоку Flask
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+# --- МЕТРИКИ (формат Prometheus) ---
+# function - лічильник, який уже веде сам об'єкт (напр. cache.hits); значення читається при експорті
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, function=None):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._function = function
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        if self._function is not None: return self._function()
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        if self._function is not None:
+            return [(self.name, (), (), self._function())]
+        return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, function=None):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._function = function
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self._function is not None: return self._function()
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        if self._function is not None:
+            return [(self.name, (), (), self._function())]
+        return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [лічильники по бакетах..., count, sum]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with _lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: data[i] += 1
+            data[-2] += 1
+            data[-1] += value
+
+    def count(self, **labels):
+        data = self._values.get(_label_key(labels))
+        return data[-2] if data else 0
+
+    def samples(self):
+        result = []
+        for key, data in self._values.items():
+            for i, bound in enumerate(self.buckets):
+                result.append((self.name + "_bucket", key, (("le", bound),), data[i]))
+            result.append((self.name + "_bucket", key, (("le", "+Inf"),), data[-2]))
+            result.append((self.name + "_count", key, (), data[-2]))
+            result.append((self.name + "_sum", key, (), data[-1]))
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, function=None):
+        return self._metrics.get(name) or self.register(Counter(name, help_text, function))
+
+    def gauge(self, name, help_text, function=None):
+        return self._metrics.get(name) or self.register(Gauge(name, help_text, function))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._metrics.get(name) or self.register(Histogram(name, help_text, buckets))
+
+    def render(self):
+        lines = []
+        with _lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            with _lock:
+                samples = metric.samples()
+            for name, key, extra, value in samples:
+                lines.append(f"{name}{_format_labels(key, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram('schedule_stage_seconds', "Time spent per stage (fetch, parse, render, telegram_edit)")
+UPSTREAM_RESPONSES = REGISTRY.counter('upstream_responses_total', "Upstream responses by route (direct/scraperapi) and status")
+HANDLER_SECONDS = REGISTRY.histogram('handler_seconds', "Telegram handler latency by action")
+EXECUTOR_INFLIGHT = REGISTRY.gauge('executor_inflight', "Jobs submitted to the thread pool and not finished yet")
+SLOW_REQUESTS = REGISTRY.counter('slow_requests_total', "Handler calls slower than SLOW_REQUEST_SECONDS")
+
+
+# --- ТРЕЙСИ ПОВІЛЬНИХ ЗАПИТІВ ---
+# Трейс живе в contextvar поточної asyncio-задачі; stage() додає в нього кроки.
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    __slots__ = ('name', 'started', 'spans')
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def format(self):
+        spans = ", ".join(f"{name}={elapsed * 1000:.0f}ms" for name, elapsed in self.spans)
+        return f"{self.name} {self.elapsed() * 1000:.0f}ms [{spans}]"
+
+
+@contextmanager
+def stage(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name, **labels)
+        trace = _current_trace.get()
+        if trace is not None: trace.spans.append((name, elapsed))
+
+
+@contextmanager
+def traced(name, histogram=HANDLER_SECONDS, **labels):
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        elapsed = trace.elapsed()
+        histogram.observe(elapsed, **labels)
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            SLOW_REQUESTS.inc(**labels)
+            if TRACE_SLOW_REQUESTS: logger.warning(f"Slow request: {trace.format()}")
+
+
+async def run_in_executor(loop, fn, *args, executor=None):
+    EXECUTOR_INFLIGHT.inc()
+    try:
+        return await loop.run_in_executor(executor, fn, *args)
+    finally:
+        EXECUTOR_INFLIGHT.dec()
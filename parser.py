@@ -6,6 +6,8 @@ import time
 import random
 import os
 import html
+import hashlib
+from functools import lru_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,6 +15,14 @@ logger = logging.getLogger(__name__)
 BASE_URL = "https://student.lpnu.ua"
 SCRAPER_API_KEY = os.environ.get('SCRAPER_API_KEY', None)
 
+# fast - парсити лише блок view-content (lxml, якщо встановлено); classic - всю сторінку html.parser
+PARSER_MODE = os.environ.get('PARSER_MODE', 'fast')
+try:
+    import lxml  # noqa: F401
+    FAST_HTML_PARSER = 'lxml'
+except ImportError:
+    FAST_HTML_PARSER = 'html.parser'
+
 # --- CONFIG ---
 DAY_MAP = {
     "Понеділок": ["пн", "пон", "mon"],
@@ -24,13 +34,22 @@ DAY_MAP = {
     "Неділя":    ["нд", "нед", "sun"]
 }
 
+# Індекс варіантів: variant -> (порядок у DAY_MAP, день). Перевіряються лише префікси
+# відомих довжин; при кількох збігах перемагає той, що раніше в DAY_MAP (як при лінійному переборі).
+DAY_INDEX = {}
+for _standard_name, _variants in DAY_MAP.items():
+    for _variant in _variants:
+        DAY_INDEX.setdefault(_variant, (len(DAY_INDEX), _standard_name))
+DAY_PREFIX_LENGTHS = sorted({len(v) for v in DAY_INDEX})
+NON_WORD_RE = re.compile(r'[^\w]')
+
 def get_standard_day_name(line):
-    clean_line = re.sub(r'[^\w]', '', line).lower()
-    for standard_name, variants in DAY_MAP.items():
-        for variant in variants:
-            if clean_line.startswith(variant):
-                return standard_name
-    return None
+    clean_line = NON_WORD_RE.sub('', line).lower()
+    best = None
+    for n in DAY_PREFIX_LENGTHS:
+        hit = DAY_INDEX.get(clean_line[:n])
+        if hit and (best is None or hit[0] < best[0]): best = hit
+    return best[1] if best else None
 
 # --- ЗАПИТ ---
 def make_request(group_name, semester, duration):
@@ -60,117 +79,227 @@ def make_request(group_name, semester, duration):
             
     return response
 
-# --- ПАРСЕР ---
-def fetch_schedule_dict(group_name, semester="1", duration="1", subgroup=None, week_filter=None):
+# --- ЗАВАНТАЖЕННЯ СТОРІНКИ ---
+def load_content(page_text):
+    soup = BeautifulSoup(page_text, 'html.parser')
+    return soup, soup.find('div', class_='view-content')
+
+def missing_content_info(soup, group_name):
+    if "не знайдено" in soup.text.lower():
+        return {"Info": f"❌ Групу <b>{html.escape(group_name)}</b> не знайдено."}
+    # DEBUG: Якщо контенту немає, покажемо заголовок сторінки
+    title = soup.title.string if soup.title else "No Title"
+    return {"Info": f"❌ Не вдалося отримати дані. Заголовок сторінки: {title}"}
+
+# --- БЛОК view-content БЕЗ BeautifulSoup ---
+# Швидко вирізає <div class="view-content">...</div> з сирого HTML (баланс div-тегів),
+# щоб порахувати хеш і не парсити сторінку, якщо розклад не змінився.
+VIEW_CONTENT_RE = re.compile(r'<div\b[^>]*\bclass\s*=\s*["\'][^"\']*(?<![\w-])view-content(?![\w-])[^>]*>', re.IGNORECASE)
+DIV_TAG_RE = re.compile(r'<(/?)div\b', re.IGNORECASE)
+TAG_RE = re.compile(r'<[^>]*>')
+
+def extract_view_content(page_text):
+    start = VIEW_CONTENT_RE.search(page_text)
+    if not start: return None
+    depth = 1
+    for tag in DIV_TAG_RE.finditer(page_text, start.end()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            end = page_text.find('>', tag.end())
+            return page_text[start.start():end + 1 if end != -1 else len(page_text)]
+    return page_text[start.start():]
+
+def is_blank_region(region):
+    return not region or not html.unescape(TAG_RE.sub('', region)).strip()
+
+def content_hash(region):
+    return hashlib.blake2b(region.encode('utf-8'), digest_size=16).hexdigest()
+
+# Повний список груп - варіанти <select name="studygroup_abbrname"> у фільтрі сторінки; None, якщо його немає
+GROUP_SELECT_RE = re.compile(r'<select\b[^>]*\bname\s*=\s*["\']studygroup_abbrname["\'][^>]*>(.*?)</select>', re.IGNORECASE | re.DOTALL)
+OPTION_VALUE_RE = re.compile(r'<option\b[^>]*\bvalue\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+
+def extract_group_names(page_text):
+    select = GROUP_SELECT_RE.search(page_text)
+    if not select: return None
+    names = [html.unescape(v).strip() for v in OPTION_VALUE_RE.findall(select.group(1))]
+    return [n for n in names if n] or None
+
+# request - функція з сигнатурою make_request (для бенчмарків можна підставити фікстури).
+# (текст сторінки, блок view-content або None) чи {"Info": ...}; парсинг - лише один раз, у parse_page.
+def fetch_schedule_page(group_name, semester="1", request=None):
+    request = request or make_request
     
     # 1. Запит (Перша половина)
     try:
-        response = make_request(group_name, semester, "1")
+        response = request(group_name, semester, "1")
         if response.status_code != 200: return {"Info": f"❌ HTTP Error {response.status_code}"}
     except Exception as e:
         return {"Info": "❌ Помилка з'єднання."}
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-    content_div = soup.find('div', class_='view-content')
+    text = response.text
+    region = extract_view_content(text)
 
     # 2. Якщо пусто -> Друга половина (Duration=2)
-    if not content_div or not content_div.get_text(strip=True):
+    if is_blank_region(region):
         try:
-            response_2 = make_request(group_name, semester, "2")
+            response_2 = request(group_name, semester, "2")
             if response_2.status_code == 200:
-                soup_2 = BeautifulSoup(response_2.text, 'html.parser')
-                if soup_2.find('div', class_='view-content'):
-                    soup = soup_2
-                    content_div = soup.find('div', class_='view-content')
+                region_2 = extract_view_content(response_2.text)
+                if region_2 is not None:
+                    text, region = response_2.text, region_2
         except: pass
 
-    if not content_div:
-        if "не знайдено" in soup.text.lower():
-            return {"Info": f"❌ Групу <b>{html.escape(group_name)}</b> не знайдено."}
-        # DEBUG: Якщо контенту немає, покажемо заголовок сторінки
-        title = soup.title.string if soup.title else "No Title"
-        return {"Info": f"❌ Не вдалося отримати дані. Заголовок сторінки: {title}"}
-
-    schedule_data = {} 
-
-    # --- Фільтр підгруп ---
-    def is_excluded_subgroup(text, current_subgroup):
-        if not current_subgroup: return False
-        ex_sub = str(3 - int(current_subgroup))
-        patterns = [f"\({ex_sub}\)", f"підгр\.\s*{ex_sub}", f"{ex_sub}\s*п/г", f"підгрупа\s*{ex_sub}"]
-        text_lower = text.lower()
-        for p in patterns:
-            if re.search(p, text_lower, re.IGNORECASE):
-                our_sub = str(current_subgroup)
-                if not re.search(f"\({our_sub}\)", text_lower): return True 
-        return False
-
-    # --- Фільтр тижнів ---
-    def is_excluded_week(classes_list, current_filter):
-        if not current_filter: return False
-        cls = set(classes_list)
-        is_chys = 'chys' in cls or 'week_1' in cls
-        is_znam = 'znam' in cls or 'week_2' in cls
-        if current_filter == 'chys' and is_znam and not is_chys: return True
-        if current_filter == 'znam' and is_chys and not is_znam: return True
-        return False
+    return text, region
+
+# --- МОДЕЛЬ ---
+SUBGROUPS = ("1", "2")
+
+# Одна пара. week: 'chys' / 'znam' / None (обидва тижні);
+# subgroups: підгрупи, яким ця пара показується.
+class Lesson:
+    __slots__ = ('day', 'pair', 'week', 'subgroups', 'text')
+
+    def __init__(self, day, pair, week, subgroups, text):
+        self.day = day
+        self.pair = pair
+        self.week = week
+        self.subgroups = subgroups
+        self.text = text
+
+    def __repr__(self):
+        return f"Lesson({self.day!r}, {self.pair!r}, {self.week!r}, {sorted(self.subgroups)!r}, {self.text!r})"
+
+    def visible(self, subgroup=None, week_filter=None):
+        if subgroup and subgroup not in self.subgroups: return False
+        if week_filter and self.week and self.week != week_filter: return False
+        return True
+
+# Розклад групи без фільтрів: з нього рендеряться всі (підгрупа × тиждень) варіанти.
+class Schedule:
+    __slots__ = ('group', 'lessons', 'preview')
+
+    def __init__(self, group, lessons, preview=""):
+        self.group = group
+        self.lessons = lessons
+        self.preview = preview
+
+    def days(self, subgroup=None, week_filter=None):
+        result = {}
+        for lesson in self.lessons:
+            if lesson.visible(subgroup, week_filter):
+                result.setdefault(lesson.day, []).append(lesson)
+        return result
+
+    def same_as(self, other):
+        return other is self or (isinstance(other, Schedule) and other.to_dict() == self.to_dict())
+
+    # Компактне JSON-представлення для сховища
+    def to_dict(self):
+        return {
+            'group': self.group,
+            'preview': self.preview,
+            'lessons': [[l.day, l.pair, l.week, sorted(l.subgroups), l.text] for l in self.lessons],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        lessons = [Lesson(day, pair, week, frozenset(subgroups), text) for day, pair, week, subgroups, text in data['lessons']]
+        return cls(data['group'], lessons, data.get('preview', ""))
+
+# --- Фільтр підгруп ---
+# Для кожної підгрупи: одне скомпільоване "або" з позначок іншої підгрупи + позначка "(N)" своєї.
+@lru_cache(maxsize=None)
+def subgroup_matchers(current_subgroup):
+    ex_sub = str(3 - int(current_subgroup))
+    other = re.compile(f"\\({ex_sub}\\)|підгр\\.\\s*{ex_sub}|{ex_sub}\\s*п/г|підгрупа\\s*{ex_sub}", re.IGNORECASE)
+    own = re.compile(f"\\({current_subgroup}\\)")
+    return other, own
+
+def is_excluded_subgroup(text, current_subgroup):
+    if not current_subgroup: return False
+    other, own = subgroup_matchers(str(current_subgroup))
+    return bool(other.search(text)) and not own.search(text)
+
+def lesson_subgroups(text):
+    return frozenset(s for s in SUBGROUPS if not is_excluded_subgroup(text, s))
+
+# --- Тиждень з класів рядка ---
+def lesson_week(classes_list):
+    cls = set(classes_list)
+    is_chys = 'chys' in cls or 'week_1' in cls
+    is_znam = 'znam' in cls or 'week_2' in cls
+    if is_chys and not is_znam: return 'chys'
+    if is_znam and not is_chys: return 'znam'
+    return None
+
+# --- ПАРСЕР ---
+DAY_LINE_RE = re.compile(r'^(Понеділок|Вівторок|Середа|Четвер|П\'ятниця|Субота|Неділя|Пн|Вт|Ср|Чт|Пт|Сб|Нд)\b', re.IGNORECASE)
+PAIR_NUM_RE = re.compile(r'^[1-8]')
+
+# Сторінка -> Schedule або {"Info": ...}. region - вже вирізаний блок view-content, якщо є.
+def parse_page(page_text, group_name, region=None):
+    if PARSER_MODE == 'fast':
+        if region is None: region = extract_view_content(page_text)
+        if region is not None:
+            content_div = BeautifulSoup(region, FAST_HTML_PARSER).find('div', class_='view-content')
+            if content_div is not None: return build_schedule(content_div, group_name)
+
+    soup, content_div = load_content(page_text)
+    if not content_div: return missing_content_info(soup, group_name)
+    return build_schedule(content_div, group_name)
+
+def build_schedule(content_div, group_name):
+    lessons = []
 
     # === ВАРІАНТ 1: HTML ===
     days = content_div.find_all('div', class_='view-grouping')
     if days:
+        # Номер пари - найближчий попередній <h3>. Один прохід вперед замість
+        # row.find_previous('h3') для кожного рядка (що давало квадратичний час).
+        # <h3> поза view-content не враховуються (рядок без свого <h3> отримує "?"), а день,
+        # що трапляється в кількох view-grouping, збирає пари з усіх блоків.
+        pair_of = {}
+        pair_num = "?"
+        for el in content_div.find_all(['h3', 'div']):
+            if el.name == 'h3': pair_num = el.get_text(strip=True)
+            elif 'stud_schedule' in el.get('class', ()): pair_of[id(el)] = pair_num
+
         for day_block in days:
             header = day_block.find('span', class_='view-grouping-header')
             raw_day = header.get_text(strip=True) if header else ""
             day_name = get_standard_day_name(raw_day)
             if not day_name: continue 
             
-            day_text = f"📅 <b>{day_name}</b> ({html.escape(group_name)})\n\n"
-            has_pairs = False
-            
             rows = day_block.find_all('div', class_='stud_schedule')
             for row in rows:
-                if is_excluded_week(row.get('class', []), week_filter): continue
-
-                num_header = row.find_previous('h3')
-                pair_num = num_header.get_text(strip=True) if num_header else "?"
+                pair_num = pair_of.get(id(row), "?")
                 
                 content = row.find('div', class_='group_content')
                 if not content: content = row
                 full_pair_text = content.get_text(separator=" ", strip=True).strip()
 
-                if is_excluded_subgroup(full_pair_text, subgroup): continue
-                
-                safe_text = html.escape(full_pair_text)
-                classes = row.get('class', [])
-                week_mark = " <i>(чис.)</i>" if ('chys' in classes or 'week_1' in classes) else (" <i>(знам.)</i>" if ('znam' in classes or 'week_2' in classes) else "")
-
-                day_text += f"⏰ <b>{pair_num} пара</b>{week_mark}\n📖 {safe_text}\n──────────────\n"
-                has_pairs = True
-            
-            if has_pairs:
-                schedule_data[day_name] = day_text
+                lessons.append(Lesson(day_name, pair_num, lesson_week(row.get('class', [])), lesson_subgroups(full_pair_text), full_pair_text))
 
     # === ВАРІАНТ 2: Текст (Fallback) ===
-    if not schedule_data:
+    if not lessons:
         raw_text = content_div.get_text(separator="\n", strip=True)
         lines = [line.strip() for line in raw_text.split('\n') if line.strip()]
         current_day = None
         temp_schedule = {}
         
-        day_pattern = re.compile(r'^(Понеділок|Вівторок|Середа|Четвер|П\'ятниця|Субота|Неділя|Пн|Вт|Ср|Чт|Пт|Сб|Нд)\b', re.IGNORECASE)
-
         for line in lines:
-            match = day_pattern.match(line)
+            match = DAY_LINE_RE.match(line)
             if match:
                 current_day = get_standard_day_name(match.group(0))
                 if current_day and current_day not in temp_schedule: temp_schedule[current_day] = []
                 # Перевірка на "Пн 1 Математика"
                 rem = line[len(match.group(0)):].strip()
-                if rem and re.match(r'^[1-8]', rem):
+                if rem and PAIR_NUM_RE.match(rem):
                      temp_schedule[current_day].append({'num': rem[0], 'text': rem[1:].strip()})
                 continue
             
-            if current_day and re.match(r'^[1-8][\.\)\s]?', line):
+            if current_day and PAIR_NUM_RE.match(line):
                 pair_num = line[0]
                 text = line[1:].strip(" .)")
                 temp_schedule[current_day].append({'num': pair_num, 'text': text})
@@ -180,20 +309,43 @@ def fetch_schedule_dict(group_name, semester="1", duration="1", subgroup=None, w
                 temp_schedule[current_day][-1]['text'] += " " + line
 
         for day, pairs in temp_schedule.items():
-            day_text = f"📅 <b>{day}</b> ({html.escape(group_name)})\n\n"
-            has = False
             for p in pairs:
-                if is_excluded_subgroup(p['text'], subgroup): continue
-                day_text += f"⏰ <b>{p['num']} пара</b>\n📖 {html.escape(p['text'])}\n──────────────\n"
-                has = True
-            if has: schedule_data[day] = day_text
+                lessons.append(Lesson(day, p['num'], None, lesson_subgroups(p['text']), p['text']))
 
-    if not schedule_data:
-        # --- ДІАГНОСТИКА ---
-        # Ми повертаємо шматок тексту, щоб побачити, ЩО САМЕ там написано
-        raw_preview = content_div.get_text(separator="\n", strip=True)[:400]
+    # --- ДІАГНОСТИКА ---
+    # Ми зберігаємо шматок тексту, щоб побачити, ЩО САМЕ там написано
+    raw_preview = content_div.get_text(separator="\n", strip=True)[:400]
+    if not lessons:
         return {"Info": f"📭 Розклад порожній. Ось що бачить бот:\n\n<pre>{html.escape(raw_preview)}</pre>"}
 
+    return Schedule(group_name, lessons, raw_preview)
+
+# --- РЕНДЕР ---
+def render_day(day_name, lessons, group_name):
+    day_text = f"📅 <b>{day_name}</b> ({html.escape(group_name)})\n\n"
+    for lesson in lessons:
+        week_mark = " <i>(чис.)</i>" if lesson.week == 'chys' else (" <i>(знам.)</i>" if lesson.week == 'znam' else "")
+        day_text += f"⏰ <b>{lesson.pair} пара</b>{week_mark}\n📖 {html.escape(lesson.text)}\n──────────────\n"
+    return day_text
+
+# Старий формат: {день: HTML-текст} або {"Info": ...}
+def render_schedule(schedule, subgroup=None, week_filter=None):
+    schedule_data = {}
+    for day_name, lessons in schedule.days(subgroup, week_filter).items():
+        schedule_data[day_name] = render_day(day_name, lessons, schedule.group)
+
+    if not schedule_data:
+        return {"Info": f"📭 Розклад порожній. Ось що бачить бот:\n\n<pre>{html.escape(schedule.preview)}</pre>"}
+
     return schedule_data
 
+def fetch_schedule(group_name, semester="1", request=None):
+    page = fetch_schedule_page(group_name, semester, request)
+    if isinstance(page, dict): return page
+    text, region = page
+    return parse_page(text, group_name, region)
 
+def fetch_schedule_dict(group_name, semester="1", duration="1", subgroup=None, week_filter=None, request=None):
+    schedule = fetch_schedule(group_name, semester, request)
+    if isinstance(schedule, dict): return schedule
+    return render_schedule(schedule, subgroup, week_filter)
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+PREWARM_TOP_N = int(os.environ.get('PREWARM_TOP_N', 20))
+PREWARM_INTERVAL = int(os.environ.get('PREWARM_INTERVAL', 10 * 60))          # як часто перевіряти кеш
+PREWARM_AHEAD = int(os.environ.get('PREWARM_AHEAD', 30 * 60))                # оновлювати, якщо до кінця TTL менше
+PREWARM_STAGGER = float(os.environ.get('PREWARM_STAGGER', 5))                # пауза між оновленнями, с
+PREWARM_MAX_PER_HOUR = int(os.environ.get('PREWARM_MAX_PER_HOUR', 120))      # ліміт фонових запитів
+POPULARITY_HALF_LIFE = float(os.environ.get('POPULARITY_HALF_LIFE', 24 * 60 * 60))
+
+
+# --- ПОПУЛЯРНІСТЬ ГРУП ---
+# Лічильник запитів, що згасає з часом: вчорашній пік важить менше за сьогоднішні запити.
+class GroupPopularity:
+    def __init__(self, half_life=POPULARITY_HALF_LIFE, clock=time.time):
+        self.half_life = half_life
+        self._clock = clock
+        self._scores = {}  # group -> (score, updated_at)
+
+    def _decayed(self, score, updated_at, now):
+        return score * math.pow(0.5, (now - updated_at) / self.half_life)
+
+    def record(self, group, weight=1.0):
+        now = self._clock()
+        score, updated_at = self._scores.get(group, (0.0, now))
+        self._scores[group] = (self._decayed(score, updated_at, now) + weight, now)
+
+    def top(self, n):
+        now = self._clock()
+        ranked = sorted(((self._decayed(s, t, now), g) for g, (s, t) in self._scores.items()), reverse=True)
+        return [g for _, g in ranked[:n]]
+
+    def __len__(self):
+        return len(self._scores)
+
+
+# --- ФОНОВЕ ОНОВЛЕННЯ ---
+# Раз на interval бере top-N груп і оновлює ті, чий запис у кеші відсутній або скоро протухне.
+# Запити розносяться в часі (stagger + jitter) і обмежені max_per_hour.
+class Prewarmer:
+    def __init__(self, cache, fetch, popularity, key_for, cacheable=None, top_n=PREWARM_TOP_N,
+                 interval=PREWARM_INTERVAL, ahead=PREWARM_AHEAD, stagger=PREWARM_STAGGER,
+                 max_per_hour=PREWARM_MAX_PER_HOUR):
+        self.cache = cache
+        self.fetch = fetch
+        self.popularity = popularity
+        self.key_for = key_for
+        self.cacheable = cacheable
+        self.top_n = top_n
+        self.interval = interval
+        self.ahead = ahead
+        self.stagger = stagger
+        self.max_per_hour = max_per_hour
+        self._task = None
+        self._recent = []   # час кожного фонового запиту за останню годину
+        self._warmed = {}   # key -> скільки тривав fetch (поки запис ще ніхто не прочитав)
+        self.refreshes = 0
+        self.failures = 0
+        self.skipped_budget = 0
+        self.warm_hits = 0
+        self.latency_saved = 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
+
+    def _budget_left(self):
+        now = time.monotonic()
+        self._recent = [t for t in self._recent if now - t < 3600]
+        return self.max_per_hour - len(self._recent)
+
+    def due(self):
+        groups = []
+        for group in self.popularity.top(self.top_n):
+            remaining = self.cache.ttl_remaining(self.key_for(group))
+            if remaining is None or remaining < self.ahead:
+                groups.append(group)
+        return groups
+
+    async def refresh(self, group):
+        if self._budget_left() <= 0:
+            self.skipped_budget += 1
+            return False
+        self._recent.append(time.monotonic())
+
+        key = self.key_for(group)
+        started = time.monotonic()
+        try:
+            value = await self.fetch(group)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Prewarm {group} failed: {e!r}")
+            return False
+        if value is None or (self.cacheable and not self.cacheable(value)):
+            self.failures += 1
+            return False
+
+        self.cache.put(key, value)
+        self._warmed[key] = time.monotonic() - started
+        self.refreshes += 1
+        return True
+
+    async def run_once(self):
+        for i, group in enumerate(self.due()):
+            if i: await asyncio.sleep(self.stagger * (0.5 + random.random()))
+            await self.refresh(group)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval * (0.8 + 0.4 * random.random()))
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Prewarm loop error: {e!r}")
+
+    # Викликається, коли користувача обслужили з кешу. Перше читання прогрітого запису -
+    # це запит, який інакше чекав би на upstream.
+    def note_cache_hit(self, key):
+        duration = self._warmed.pop(key, None)
+        if duration is not None:
+            self.warm_hits += 1
+            self.latency_saved += duration
+
+    # Запис перезаписано звичайним запитом - він більше не "наш".
+    def note_cache_miss(self, key):
+        self._warmed.pop(key, None)
+
+    def stats(self):
+        return {
+            'tracked_groups': len(self.popularity),
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'skipped_budget': self.skipped_budget,
+            'budget_left': self._budget_left(),
+            'warm_hits': self.warm_hits,
+            'latency_saved_s': round(self.latency_saved, 3),
+        }
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from fetcher import TokenBucket
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+PUSH_TZ = ZoneInfo(os.environ.get('PUSH_TZ', 'Europe/Kyiv'))
+PUSH_RATE = float(os.environ.get('PUSH_RATE', 25))                            # повідомлень/с на весь бот (ліміт Telegram ~30)
+PUSH_PER_CHAT_INTERVAL = float(os.environ.get('PUSH_PER_CHAT_INTERVAL', 1))   # секунд між повідомленнями в один чат
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', 8))
+PUSH_RETRIES = 3
+RATE_WINDOW = 10  # за скільки секунд рахувати sends/s
+SLOT_LOCK_TTL = 120  # хвилина слота із запасом на розбіжність годинників реплік
+
+PUSH_SENT = REGISTRY.counter('push_sent_total', "Push messages delivered")
+PUSH_FAILED = REGISTRY.counter('push_failed_total', "Push messages not delivered, by reason")
+PUSH_LAG = REGISTRY.histogram('push_queue_lag_seconds', "Time from enqueue to delivery of a push message")
+
+
+def retry_after_seconds(error):
+    retry_after = getattr(error, 'retry_after', None)
+    if isinstance(retry_after, timedelta): return retry_after.total_seconds()
+    return retry_after
+
+
+# --- ЧЕРГА ВІДПРАВКИ ---
+# send(chat_id, text, **kwargs) - будь-яка корутина (bot.send_message або заглушка в тестах).
+# Загальний ліміт - token bucket, плюс пауза між повідомленнями в один чат; на RetryAfter
+# від Telegram вся черга стає на паузу, а повідомлення повертається в кінець.
+class Dispatcher:
+    def __init__(self, send, rate=PUSH_RATE, per_chat_interval=PUSH_PER_CHAT_INTERVAL, workers=PUSH_WORKERS,
+                 on_error=None, clock=time.monotonic):
+        self.send = send
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.on_error = on_error
+        self.limiter = TokenBucket(rate, max(1, int(rate)), clock=clock)
+        self.queue = asyncio.Queue()
+        self._clock = clock
+        self._next_allowed = {}  # chat_id -> найраніший час наступного повідомлення
+        self._paused_until = 0.0
+        self._sent_at = deque()
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.last_lag = 0.0
+
+    def submit(self, chat_id, text, **kwargs):
+        self.queue.put_nowait((self._clock(), chat_id, text, kwargs, 0))
+
+    def sends_per_second(self):
+        cutoff = self._clock() - RATE_WINDOW
+        while self._sent_at and self._sent_at[0] < cutoff: self._sent_at.popleft()
+        return len(self._sent_at) / RATE_WINDOW
+
+    async def _wait_turn(self, chat_id):
+        while True:
+            now = self._clock()
+            wait = max(self._paused_until, self._next_allowed.get(chat_id, 0.0)) - now
+            if wait <= 0: break
+            await asyncio.sleep(wait)
+        await self.limiter.acquire()
+        self._next_allowed[chat_id] = self._clock() + self.per_chat_interval
+        if len(self._next_allowed) > 10000:
+            now = self._clock()
+            self._next_allowed = {c: t for c, t in self._next_allowed.items() if t > now}
+
+    async def deliver(self, item):
+        enqueued, chat_id, text, kwargs, attempt = item
+        await self._wait_turn(chat_id)
+        try:
+            await self.send(chat_id, text, **kwargs)
+        except Exception as e:
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None and attempt < PUSH_RETRIES:
+                self._paused_until = max(self._paused_until, self._clock() + retry_after)
+                self.queue.put_nowait((enqueued, chat_id, text, kwargs, attempt + 1))
+                PUSH_FAILED.inc(reason='retry_after')
+                return
+            self.failed += 1
+            PUSH_FAILED.inc(reason=type(e).__name__)
+            logger.warning(f"Push to {chat_id} failed: {e!r}")
+            if self.on_error is not None: await self.on_error(chat_id, e)
+            return
+        now = self._clock()
+        self.last_lag = now - enqueued
+        PUSH_LAG.observe(self.last_lag)
+        PUSH_SENT.inc()
+        self.sent += 1
+        self._sent_at.append(now)
+
+    async def worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self.deliver(item)
+            except Exception as e:
+                logger.error(f"Push worker error: {e!r}")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        return self
+
+    async def stop(self):
+        for task in self._tasks: task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self):
+        await self.queue.join()
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'sends_per_second': round(self.sends_per_second(), 2),
+            'lag_seconds': round(self.last_lag, 3),
+        }
+
+
+# --- ЩОДЕННА РОЗСИЛКА ---
+# subscriptions() -> {chat_id: (група, підгрупа, тиждень, "HH:MM")} і get_schedule(група) - async;
+# render(schedule, група, підгрупа, тиждень, now) -> (текст, kwargs) або None, якщо пар немає.
+# Рендер один на (група, підгрупа, тиждень), скільки б не було підписників.
+# state - спільний стан (state.StateBackend): слот розсилає лише репліка, що взяла його блокування.
+class PushScheduler:
+    def __init__(self, subscriptions, get_schedule, render, dispatcher, tz=PUSH_TZ, state=None):
+        self.subscriptions = subscriptions
+        self.get_schedule = get_schedule
+        self.render = render
+        self.dispatcher = dispatcher
+        self.tz = tz
+        self.state = state
+        self.renders = 0
+        self.subscribed = 0
+        self._task = None
+
+    async def due(self, slot):
+        subscriptions = await self.subscriptions()
+        self.subscribed = len(subscriptions)
+        result = {}
+        for chat_id, (group, subgroup, week, send_at) in subscriptions.items():
+            if send_at == slot: result.setdefault((group, subgroup, week), []).append(chat_id)
+        return result
+
+    async def run_once(self, now=None):
+        now = now or datetime.now(self.tz)
+        slot = now.strftime('%H:%M')
+        # Блокування не відпускається: репліка з відсталим годинником не повторить той самий слот
+        if self.state is not None and await self.state.acquire_lock(f"push:{now:%Y-%m-%d} {slot}", SLOT_LOCK_TTL) is None:
+            return 0
+        due = await self.due(slot)
+        if not due: return 0
+
+        groups = list({group for group, _, _ in due})
+        results = await asyncio.gather(*(self.get_schedule(g) for g in groups), return_exceptions=True)
+        schedules = dict(zip(groups, results))
+
+        queued = 0
+        for (group, subgroup, week), chats in due.items():
+            schedule = schedules[group]
+            if isinstance(schedule, Exception):
+                logger.warning(f"Push {slot}: {group} failed: {schedule!r}")
+                continue
+            rendered = self.render(schedule, group, subgroup, week, now)
+            self.renders += 1
+            if rendered is None: continue
+            text, kwargs = rendered
+            for chat_id in chats:
+                self.dispatcher.submit(chat_id, text, **kwargs)
+            queued += len(chats)
+        logger.info(f"Push {slot}: {queued} messages from {len(due)} renders ({len(groups)} groups)")
+        return queued
+
+    async def run(self):
+        while True:
+            now = datetime.now(self.tz)
+            next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            await asyncio.sleep((next_minute - now).total_seconds())
+            try:
+                await self.run_once(next_minute)
+            except Exception as e:
+                logger.error(f"Push error: {e!r}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
@@ -0,0 +1,253 @@
+import abc
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+from cache import ScheduleCache, CACHE_TTL
+from fetcher import UPSTREAM_RATE, UPSTREAM_BURST
+from parser import Schedule
+
+try:
+    import redis.asyncio as aioredis  # необов'язкова залежність: потрібна лише для STATE_URL=redis://...
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+# Без STATE_URL стан живе в пам'яті процесу (одна репліка)
+STATE_URL = os.environ.get('STATE_URL') or os.environ.get('REDIS_URL')
+STATE_PREFIX = os.environ.get('STATE_PREFIX', 'rozklad:')
+FETCH_LOCK_TTL = float(os.environ.get('FETCH_LOCK_TTL', 30))    # скільки живе блокування, якщо репліка впала
+FETCH_LOCK_WAIT = float(os.environ.get('FETCH_LOCK_WAIT', 20))  # скільки чекати на результат іншої репліки
+LOCK_POLL_INTERVAL = 0.2
+
+
+def schedule_key(key):
+    return "schedule:" + ":".join(key)
+
+
+# --- СПІЛЬНИЙ СТАН ---
+# Розклади, групи користувачів, підписки на розсилку, блокування "один fetch на групу" і спільний ліміт запитів.
+# MemoryBackend - для однієї репліки, RedisBackend - для кількох.
+class StateBackend(abc.ABC):
+    shared = False
+
+    # (fetched_at, розклад) або None; fetched_at - time.time() запиту до upstream
+    @abc.abstractmethod
+    async def get_schedule_entry(self, key): ...
+    @abc.abstractmethod
+    async def put_schedule(self, key, schedule, ttl=CACHE_TTL, fetched_at=None): ...
+    @abc.abstractmethod
+    async def get_user_group(self, chat_id): ...
+    @abc.abstractmethod
+    async def set_user_group(self, chat_id, group): ...
+    # Групи з диска при старті; вже відомі стану не перезаписуються (інша репліка могла оновити)
+    @abc.abstractmethod
+    async def seed_user_groups(self, groups): ...
+    # chat_id -> (група, підгрупа, тиждень, "HH:MM")
+    @abc.abstractmethod
+    async def get_subscriptions(self): ...
+    @abc.abstractmethod
+    async def set_subscription(self, chat_id, group, subgroup, week, send_at): ...
+    # True, якщо підписка була
+    @abc.abstractmethod
+    async def delete_subscription(self, chat_id): ...
+    # Токен, якщо блокування взято; None - його тримає хтось інший
+    @abc.abstractmethod
+    async def acquire_lock(self, name, ttl=FETCH_LOCK_TTL): ...
+    @abc.abstractmethod
+    async def release_lock(self, name, token): ...
+    @abc.abstractmethod
+    async def is_locked(self, name): ...
+    # GCRA: 0, якщо запит можна робити зараз, інакше - скільки секунд почекати
+    @abc.abstractmethod
+    async def rate_wait(self, name, rate, burst): ...
+
+    async def close(self):
+        pass
+
+    async def get_schedule(self, key):
+        entry = await self.get_schedule_entry(key)
+        return entry[1] if entry else None
+
+    # Чекаємо, поки інша репліка покладе розклад (або відпустить блокування); (fetched_at, розклад) або None
+    async def wait_schedule_entry(self, key, timeout=FETCH_LOCK_WAIT):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            entry = await self.get_schedule_entry(key)
+            if entry is not None: return entry
+            if not await self.is_locked(schedule_key(key)): return None
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        return None
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.schedules = ScheduleCache(clock=clock)
+        self.users = {}
+        self.subscriptions = {}
+        self._locks = {}  # name -> (token, expires_at)
+        self._rates = {}  # name -> theoretical arrival time
+
+    async def get_schedule_entry(self, key):
+        return self.schedules.get(key)
+
+    async def put_schedule(self, key, schedule, ttl=CACHE_TTL, fetched_at=None):
+        self.schedules.put(key, (fetched_at or time.time(), schedule), ttl)
+
+    async def get_user_group(self, chat_id):
+        return self.users.get(chat_id)
+
+    async def set_user_group(self, chat_id, group):
+        self.users[chat_id] = group
+
+    async def seed_user_groups(self, groups):
+        for chat_id, group in groups.items(): self.users.setdefault(chat_id, group)
+
+    async def get_subscriptions(self):
+        return dict(self.subscriptions)
+
+    async def set_subscription(self, chat_id, group, subgroup, week, send_at):
+        self.subscriptions[chat_id] = (group, subgroup, week, send_at)
+
+    async def delete_subscription(self, chat_id):
+        return self.subscriptions.pop(chat_id, None) is not None
+
+    async def acquire_lock(self, name, ttl=FETCH_LOCK_TTL):
+        if await self.is_locked(name): return None
+        now = self._clock()
+        # Прострочені блокування (слоти розсилки ніхто не відпускає) прибираємо, як це робить TTL у Redis
+        self._locks = {n: lock for n, lock in self._locks.items() if lock[1] > now}
+        token = uuid.uuid4().hex
+        self._locks[name] = (token, now + ttl)
+        return token
+
+    async def release_lock(self, name, token):
+        if self._locks.get(name, (None,))[0] == token:
+            del self._locks[name]
+
+    async def is_locked(self, name):
+        lock = self._locks.get(name)
+        return lock is not None and lock[1] > self._clock()
+
+    async def rate_wait(self, name, rate, burst):
+        now = self._clock()
+        interval = 1 / rate
+        tat = max(self._rates.get(name, now), now) + interval
+        wait = tat - now - burst * interval
+        if wait > 1e-9: return wait  # похибка float не має блокувати burst=1 назавжди
+        self._rates[name] = tat
+        return 0
+
+
+# GCRA в одному скрипті, щоб усі репліки ділили один бюджет атомарно (час - з Redis, не з реплік)
+RATE_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+tat = tat + interval
+local wait = tat - now - burst * interval
+if wait > 0 then return math.ceil(wait) end
+redis.call('SET', KEYS[1], tat, 'PX', math.ceil(tat - now))
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class RedisBackend(StateBackend):
+    shared = True
+
+    def __init__(self, url=STATE_URL, prefix=STATE_PREFIX, client=None):
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("STATE_URL задано, але пакет redis не встановлено (pip install redis)")
+            client = aioredis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self._rate_script = client.register_script(RATE_SCRIPT)
+        self._release_script = client.register_script(RELEASE_SCRIPT)
+
+    async def get_schedule_entry(self, key):
+        payload = await self.client.get(self.prefix + schedule_key(key))
+        if not payload: return None
+        data = json.loads(payload)
+        if 'schedule' not in data: return None  # запис старого формату - просто тягнемо заново
+        return data['fetched_at'], Schedule.from_dict(data['schedule'])
+
+    async def put_schedule(self, key, schedule, ttl=CACHE_TTL, fetched_at=None):
+        payload = json.dumps({'fetched_at': fetched_at or time.time(), 'schedule': schedule.to_dict()}, ensure_ascii=False)
+        await self.client.set(self.prefix + schedule_key(key), payload, px=int(ttl * 1000))
+
+    async def get_user_group(self, chat_id):
+        return await self.client.hget(self.prefix + "users", str(chat_id))
+
+    async def set_user_group(self, chat_id, group):
+        await self.client.hset(self.prefix + "users", str(chat_id), group)
+
+    async def seed_user_groups(self, groups):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for chat_id, group in groups.items(): pipe.hsetnx(self.prefix + "users", str(chat_id), group)
+            await pipe.execute()
+
+    async def get_subscriptions(self):
+        rows = await self.client.hgetall(self.prefix + "subscriptions")
+        return {int(chat_id): tuple(json.loads(value)) for chat_id, value in rows.items()}
+
+    async def set_subscription(self, chat_id, group, subgroup, week, send_at):
+        payload = json.dumps([group, subgroup, week, send_at], ensure_ascii=False)
+        await self.client.hset(self.prefix + "subscriptions", str(chat_id), payload)
+
+    async def delete_subscription(self, chat_id):
+        return bool(await self.client.hdel(self.prefix + "subscriptions", str(chat_id)))
+
+    async def acquire_lock(self, name, ttl=FETCH_LOCK_TTL):
+        token = uuid.uuid4().hex
+        ok = await self.client.set(self.prefix + "lock:" + name, token, nx=True, px=int(ttl * 1000))
+        return token if ok else None
+
+    async def release_lock(self, name, token):
+        await self._release_script(keys=[self.prefix + "lock:" + name], args=[token])
+
+    async def is_locked(self, name):
+        return bool(await self.client.exists(self.prefix + "lock:" + name))
+
+    async def rate_wait(self, name, rate, burst):
+        wait_ms = await self._rate_script(keys=[self.prefix + "rate:" + name], args=[1000 / rate, burst])
+        return float(wait_ms) / 1000
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def make_backend(url=STATE_URL):
+    if not url: return MemoryBackend()
+    logger.info(f"State backend: {url.split('@')[-1]}")
+    return RedisBackend(url)
+
+
+# --- СПІЛЬНИЙ ЛІМІТ ЗАПИТІВ ---
+# Замінник fetcher.TokenBucket: один бюджет UPSTREAM_RATE на всі репліки
+class SharedRateLimiter:
+    def __init__(self, backend, name="upstream", rate=UPSTREAM_RATE, burst=UPSTREAM_BURST):
+        self.backend = backend
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    async def acquire(self):
+        while True:
+            wait = await self.backend.rate_wait(self.name, self.rate, self.burst)
+            if wait <= 0: return
+            await asyncio.sleep(wait)
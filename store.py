@@ -0,0 +1,261 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+from parser import Schedule
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+STORE_PATH = os.environ.get('STORE_PATH', 'schedule.db')
+STORE_FLUSH_INTERVAL = float(os.environ.get('STORE_FLUSH_INTERVAL', 5))
+STORE_BATCH_SIZE = int(os.environ.get('STORE_BATCH_SIZE', 50))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    group_name TEXT NOT NULL,
+    semester   TEXT NOT NULL,
+    duration   TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    payload    TEXT NOT NULL,
+    PRIMARY KEY (group_name, semester, duration)
+);
+CREATE TABLE IF NOT EXISTS user_groups (
+    chat_id    INTEGER PRIMARY KEY,
+    group_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    chat_id    INTEGER PRIMARY KEY,
+    group_name TEXT NOT NULL,
+    subgroup   TEXT NOT NULL,
+    week       TEXT NOT NULL,
+    send_at    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_names (
+    group_name TEXT PRIMARY KEY
+);
+"""
+
+
+# Відкриті сховища; при виході з процесу їхні черги скидаються на диск (один хук на всі,
+# без сильних посилань - закинуте сховище не тримається в пам'яті до виходу)
+_OPEN_STORES = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_stores():
+    for store in list(_OPEN_STORES):
+        store.flush()
+
+
+# --- СХОВИЩЕ НА ДИСКУ ---
+# SQLite у режимі WAL. При старті читається лише індекс (ключі + час отримання),
+# самі розклади - на вимогу. Записи накопичуються і скидаються пачками.
+# connect - фабрика з'єднань із сигнатурою sqlite3.connect (у тестах можна підставити свою).
+class ScheduleStore:
+    def __init__(self, path=STORE_PATH, flush_interval=STORE_FLUSH_INTERVAL, batch_size=STORE_BATCH_SIZE,
+                 connect=sqlite3.connect):
+        self.path = path
+        self.connect = connect
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._conn = None
+        self._lock = threading.Lock()          # з'єднання
+        self._pending_lock = threading.Lock()  # черга записів (flush працює в пулі потоків)
+        self._index = {}            # (group, semester, duration) -> fetched_at
+        self._pending_schedules = {}
+        self._pending_users = {}
+        self._pending_subscriptions = {}  # chat_id -> (група, підгрупа, тиждень, "HH:MM") або None (видалити)
+        self._writing = {}
+        self._flushing = None  # фоновий flush у пулі потоків
+        self._task = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = self.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            for group, semester, duration, fetched_at in conn.execute(
+                    "SELECT group_name, semester, duration, fetched_at FROM schedules"):
+                self._index[(group, semester, duration)] = fetched_at
+            self._conn = conn
+            _OPEN_STORES.add(self)
+            logger.info(f"Store {self.path}: {len(self._index)} schedules indexed")
+        return self._conn
+
+    def open(self):
+        with self._lock:
+            self._connect()
+        return self
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        _OPEN_STORES.discard(self)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return list(self._index)
+
+    def fetched_at(self, key):
+        return self._index.get(key)
+
+    # --- РОЗКЛАДИ ---
+    def get_schedule(self, key):
+        with self._pending_lock:
+            pending = self._pending_schedules.get(key) or self._writing.get(key)
+        if pending is not None:
+            return pending[1]
+        if key not in self._index:
+            return None
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT payload FROM schedules WHERE group_name=? AND semester=? AND duration=?", key).fetchone()
+        if row is None:
+            return None
+        try:
+            return Schedule.from_dict(json.loads(row[0]))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Store: broken entry {key}: {e!r}")
+            return None
+
+    # Те саме, але читання з диска - у пулі потоків, щоб не блокувати цикл подій
+    async def load_schedule(self, key):
+        if key not in self._index: return None
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_schedule, key)
+
+    def put_schedule(self, key, schedule, fetched_at=None):
+        fetched_at = fetched_at or time.time()
+        with self._pending_lock:
+            self._pending_schedules[key] = (fetched_at, schedule)
+        self._index[key] = fetched_at
+        self._maybe_flush()
+
+    # --- КОРИСТУВАЧІ ---
+    def user_groups(self):
+        with self._lock:
+            rows = self._connect().execute("SELECT chat_id, group_name FROM user_groups").fetchall()
+        result = dict(rows)
+        with self._pending_lock:
+            result.update(self._pending_users)
+        return result
+
+    def set_user_group(self, chat_id, group):
+        with self._pending_lock:
+            self._pending_users[chat_id] = group
+        self._maybe_flush()
+
+    # --- ПІДПИСКИ ---
+    def subscriptions(self):
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT chat_id, group_name, subgroup, week, send_at FROM subscriptions").fetchall()
+        result = {chat_id: tuple(rest) for chat_id, *rest in rows}
+        with self._pending_lock:
+            for chat_id, subscription in self._pending_subscriptions.items():
+                if subscription is None: result.pop(chat_id, None)
+                else: result[chat_id] = subscription
+        return result
+
+    def set_subscription(self, chat_id, group, subgroup, week, send_at):
+        with self._pending_lock:
+            self._pending_subscriptions[chat_id] = (group, subgroup, week, send_at)
+        self._maybe_flush()
+
+    def delete_subscription(self, chat_id):
+        with self._pending_lock:
+            self._pending_subscriptions[chat_id] = None
+        self._maybe_flush()
+
+    # --- ПОВНИЙ СПИСОК ГРУП ---
+    # Пишеться одразу (рідко: раз після crawl або першої завантаженої сторінки)
+    def group_names(self):
+        with self._lock:
+            return [name for name, in self._connect().execute("SELECT group_name FROM group_names")]
+
+    def set_group_names(self, names):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM group_names")
+                conn.executemany("INSERT OR IGNORE INTO group_names VALUES (?)", [(name,) for name in names])
+
+    # --- ЗАПИС ---
+    # У циклі подій пачка пишеться в пулі потоків; поза ним (atexit, скрипти) - одразу
+    def _maybe_flush(self):
+        if len(self._pending_schedules) + len(self._pending_users) + len(self._pending_subscriptions) < self.batch_size:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flushing is None or self._flushing.done():
+            self._flushing = loop.run_in_executor(None, self.flush)
+            self._flushing.add_done_callback(self._flush_done)
+
+    @staticmethod
+    def _flush_done(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Store flush error: {future.exception()!r}")
+
+    # Один flush за раз; якщо запис не вдався, пачка повертається в чергу (новіші зміни важливіші)
+    def flush(self):
+        with self._lock:
+            with self._pending_lock:
+                if not self._pending_schedules and not self._pending_users and not self._pending_subscriptions:
+                    return
+                schedules, self._pending_schedules = self._pending_schedules, {}
+                users, self._pending_users = self._pending_users, {}
+                subscriptions, self._pending_subscriptions = self._pending_subscriptions, {}
+                self._writing = schedules
+            try:
+                rows = [(*key, fetched_at, json.dumps(schedule.to_dict(), ensure_ascii=False, separators=(',', ':')))
+                        for key, (fetched_at, schedule) in schedules.items()]
+                conn = self._connect()
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO schedules VALUES (?, ?, ?, ?, ?)", rows)
+                    conn.executemany("INSERT OR REPLACE INTO user_groups VALUES (?, ?)", list(users.items()))
+                    conn.executemany("INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?, ?)",
+                                     [(chat_id, *sub) for chat_id, sub in subscriptions.items() if sub is not None])
+                    conn.executemany("DELETE FROM subscriptions WHERE chat_id=?",
+                                     [(chat_id,) for chat_id, sub in subscriptions.items() if sub is None])
+            except Exception:
+                with self._pending_lock:
+                    self._pending_schedules = {**schedules, **self._pending_schedules}
+                    self._pending_users = {**users, **self._pending_users}
+                    self._pending_subscriptions = {**subscriptions, **self._pending_subscriptions}
+                raise
+            finally:
+                with self._pending_lock:
+                    self._writing = {}
+        logger.debug(f"Store flush: {len(rows)} schedules, {len(users)} users, {len(subscriptions)} subscriptions")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await loop.run_in_executor(None, self.flush)
+            except Exception as e:
+                logger.error(f"Store flush error: {e!r}")
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import ScheduleCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    clock = Clock()
+    cache = ScheduleCache(ttl=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2, ttl=30)
+    clock.now = 10
+    assert "a" not in cache and cache.get("a") is None
+    assert cache.get("b") == 2 and cache.ttl_remaining("b") == 20
+    assert cache.peek("a") is None  # прострочений запис видалено при get
+    assert (cache.hits, cache.misses, cache.expirations) == (1, 1, 1)
+
+
+def test_lru_eviction():
+    cache = ScheduleCache(max_entries=2, clock=Clock())
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" стає найсвіжішим
+    cache.put("c", 3)
+    assert cache.peek("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+    assert cache.stats()['hit_rate'] == 1.0
+
+
+def test_concurrent_requests_share_one_fetch():
+    async def main():
+        cache = ScheduleCache(clock=Clock())
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "schedule"
+
+        results = await asyncio.gather(*(cache.get_or_fetch("a", fetch) for _ in range(5)))
+        assert results == ["schedule"] * 5 and len(calls) == 1
+        assert cache.coalesced == 4 and cache.get("a") == "schedule"
+
+        # Не-кешовані значення (помилки {"Info": ...}) не зберігаються
+        assert await cache.get_or_fetch("b", lambda: fetch(), cacheable=lambda v: v != "schedule") == "schedule"
+        assert "b" not in cache
+    asyncio.run(main())
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    async def main():
+        cache = ScheduleCache(clock=Clock())
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "schedule"
+
+        leader = asyncio.ensure_future(cache.get_or_fetch("a", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_fetch("a", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await waiter == "schedule"
+        assert leader.cancelled() and cache.get("a") == "schedule"
+    asyncio.run(main())
+
+
+def test_fetch_error_reaches_all_waiters():
+    async def main():
+        cache = ScheduleCache(clock=Clock())
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(cache.get_or_fetch("a", fetch) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert cache.stats()['inflight'] == 0
+        with pytest.raises(RuntimeError):
+            await cache.get_or_fetch("a", fetch)
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from callbacks import MAX_BYTES, decode, encode  # noqa: E402
+
+
+def test_round_trip():
+    data = encode('fd', "ФЛ_КЛ-11", "all", "chys", "Пн")
+    assert data == "v1|fd|ФЛ_КЛ-11|all|chys|Пн"
+    callback = decode(data)
+    assert (callback.action, callback.group, callback.sub, callback.week, callback.day) == ('fd', "ФЛ_КЛ-11", "all", "chys", "Пн")
+
+
+def test_legacy_format():
+    callback = decode("fd_Пн_ФЛ_КЛ-11_all_chys")
+    assert (callback.action, callback.group, callback.sub, callback.week, callback.day) == ('fd', "ФЛ_КЛ-11", "all", "chys", "Пн")
+    assert decode("week_chys").action == 'unknown'
+
+
+def test_repr_of_unknown_action():
+    assert repr(decode("garbage")) == "Callback('unknown')"
+    assert repr(decode("v1|s|АВ-11|1")) == "Callback('sub', group='АВ-11', sub='1')"
+
+
+def test_encode_rejects_separator_and_oversized_data():
+    with pytest.raises(ValueError):
+        encode('grp', "АВ|11")
+    with pytest.raises(ValueError):
+        encode('grp', "Г" * MAX_BYTES)
+    assert len(encode('grp', "Г" * 29).encode('utf-8')) <= MAX_BYTES
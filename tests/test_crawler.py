@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import crawler  # noqa: E402
+from store import ScheduleStore  # noqa: E402
+
+FIXTURES_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+PAGES = {'АВ-11': 'grid.html', 'КН-21': 'text.html', 'ТХ-1': 'grid.html', 'ПМ-41': 'grid.html'}
+
+
+# --- ЗАГЛУШКА student.lpnu.ua ---
+# ТХ-1 перші два рази відповідає 503; невідомі групи - сторінка "не знайдено"
+class Upstream:
+    def __init__(self):
+        self.hits = []
+        self.failures = {'ТХ-1': 2}
+        self.loop = asyncio.new_event_loop()
+        self.runner = None
+        self.url = None
+
+    async def schedule(self, request):
+        group = request.query.get('studygroup_abbrname', '')
+        self.hits.append(group)
+        if self.failures.get(group):
+            self.failures[group] -= 1
+            return web.Response(status=503)
+        with open(os.path.join(FIXTURES_DIR, PAGES.get(group, 'not_found.html')), encoding='utf-8') as f:
+            return web.Response(text=f.read(), content_type='text/html')
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get('/students_schedule', self.schedule)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    def start(self):
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result(5)
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@pytest.fixture
+def upstream():
+    server = Upstream().start()
+    yield server
+    server.stop()
+
+
+def run_crawler(upstream, tmp_path, *groups):
+    return crawler.main([*groups, '--base-url', upstream.url, '--store', str(tmp_path / 'schedule.db'),
+                         '--state', str(tmp_path / 'crawl.state'), '--rate', '1000', '--burst', '100',
+                         '--backoff', '0.01', '--workers', '1', '--concurrency', '2'])
+
+
+def test_crawl_retries_marks_and_stores(upstream, tmp_path):
+    assert run_crawler(upstream, tmp_path, 'АВ-11', 'ТХ-1', 'НЕМА-1') == 0
+
+    assert upstream.hits.count('ТХ-1') == 3  # два 503, потім успіх
+    assert crawler.load_state(str(tmp_path / 'crawl.state')) == {'АВ-11': 'ok', 'ТХ-1': 'ok', 'НЕМА-1': 'not_found'}
+
+    store = ScheduleStore(str(tmp_path / 'schedule.db')).open()
+    assert sorted(store.keys()) == [('АВ-11', '1', '1'), ('ТХ-1', '1', '1')]
+    assert store.get_schedule(('АВ-11', '1', '1')).lessons
+    store.close()
+
+
+def test_crawl_resumes_from_state_file(upstream, tmp_path):
+    (tmp_path / 'crawl.state').write_text("АВ-11\tok\nНЕМА-1\tnot_found\nКН-21\tfailed\n", encoding='utf-8')
+
+    assert run_crawler(upstream, tmp_path, 'АВ-11', 'НЕМА-1', 'КН-21', 'ПМ-41') == 0
+
+    assert sorted(set(upstream.hits)) == ['КН-21', 'ПМ-41']
+    assert crawler.load_state(str(tmp_path / 'crawl.state'))['КН-21'] == 'ok'
+    store = ScheduleStore(str(tmp_path / 'schedule.db')).open()
+    assert sorted(store.keys()) == [('КН-21', '1', '1'), ('ПМ-41', '1', '1')]
+    store.close()
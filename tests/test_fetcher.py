@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetcher import UpstreamClient  # noqa: E402
+
+SCHEDULE_PAGE = '<html><div class="view-content"><div class="stud_schedule">Пара</div></div></html>'
+CHALLENGE_PAGE = '<html><title>Just a moment...</title><script>challenge()</script></html>'
+NOT_FOUND_PAGE = '<html><div class="messages">Групу не знайдено</div></html>'
+
+
+class SlowLimiter:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def acquire(self):
+        await asyncio.sleep(self.delay)
+
+
+# Фейковий сайт і фейковий ScraperAPI на одному сервері; hits - скільки запитів отримав кожен
+def stub_upstream(direct_page, direct_latency=0.0):
+    hits = {'direct': 0, 'scraperapi': 0}
+
+    async def direct(request):
+        hits['direct'] += 1
+        await asyncio.sleep(direct_latency)
+        return web.Response(text=direct_page, content_type='text/html')
+
+    async def scraper(request):
+        hits['scraperapi'] += 1
+        return web.Response(text=SCHEDULE_PAGE, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/students_schedule', direct)
+    app.router.add_get('/scraper', scraper)
+    return app, hits
+
+
+def fetch(direct_page, direct_latency=0.0, hedge_delay=3.0, **kwargs):
+    async def main():
+        app, hits = stub_upstream(direct_page, direct_latency)
+        async with TestServer(app) as server:
+            url = str(server.make_url(''))
+            client = UpstreamClient(base_url=url, scraper_api_key="key", scraper_api_url=url + "/scraper", **kwargs)
+            client.hedge_delay = hedge_delay
+            try:
+                response = await client.make_request("АВ-11", "1", "1")
+            finally:
+                await client.close()
+            return response, hits
+    return asyncio.run(main())
+
+
+def test_scraperapi_is_primary_when_key_is_configured():
+    assert UpstreamClient(scraper_api_key="key").routes[0] == 'scraperapi'
+    assert UpstreamClient(scraper_api_key=None).routes == ['direct']
+
+
+def test_waiting_for_a_token_does_not_start_a_hedge():
+    # Токен чекаємо довше за hedge_delay, сама відповідь - швидша
+    response, hits = fetch(SCHEDULE_PAGE, direct_latency=0.05, hedge_delay=0.1, routes=['direct', 'scraperapi'], limiter=SlowLimiter(0.3))
+    assert response.text == SCHEDULE_PAGE and hits == {'direct': 1, 'scraperapi': 0}
+
+
+def test_hedge_after_slow_response():
+    response, hits = fetch(SCHEDULE_PAGE, direct_latency=1.0, hedge_delay=0.05, routes=['direct', 'scraperapi'])
+    assert hits == {'direct': 1, 'scraperapi': 1}
+
+
+def test_challenge_page_does_not_win():
+    response, hits = fetch(CHALLENGE_PAGE, routes=['direct', 'scraperapi'])
+    assert response.text == SCHEDULE_PAGE and hits == {'direct': 1, 'scraperapi': 1}
+
+
+def test_not_found_page_wins():
+    response, hits = fetch(NOT_FOUND_PAGE, routes=['direct', 'scraperapi'])
+    assert response.text == NOT_FOUND_PAGE and hits == {'direct': 1, 'scraperapi': 0}
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('STORE_PATH', os.path.join(tempfile.mkdtemp(prefix='tests-'), 'schedule.db'))
+
+import bot  # noqa: E402
+from group_index import GroupIndex  # noqa: E402
+from parser import extract_group_names  # noqa: E402
+
+FIXTURES_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+
+
+def test_index_is_complete_only_after_seed():
+    index = GroupIndex(f"АВ-{n}" for n in range(1000))
+    assert not index.is_complete()
+    index.seed(["КН-21"])
+    assert index.is_complete()
+    assert index.get("кн_21") == "КН-21" and index.get("КН-99") is None
+
+
+def test_group_names_from_schedule_page():
+    with open(os.path.join(FIXTURES_DIR, 'not_found.html'), encoding='utf-8') as f:
+        names = extract_group_names(f.read())
+    assert len(names) == 480 and names[0] == "АВ-11"
+    assert extract_group_names("<html><body>503</body></html>") is None
+
+
+# --- /rozklad ---
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        self.replies.append((text, reply_markup))
+
+
+class FakeUpdate:
+    def __init__(self, chat_id):
+        self.effective_chat = type('Chat', (), {'id': chat_id})()
+        self.message = FakeMessage()
+
+
+class FakeContext:
+    def __init__(self, *args):
+        self.args = list(args)
+
+
+def rozklad(*args):
+    update = FakeUpdate(1)
+    asyncio.run(bot.get_rozklad(update, FakeContext(*args)))
+    text, markup = update.message.replies[-1]
+    buttons = [b.text for row in markup.inline_keyboard for b in row] if markup else []
+    return text, buttons
+
+
+def test_rozklad_before_and_after_seed(monkeypatch):
+    monkeypatch.setattr(bot, 'GROUP_INDEX', GroupIndex(["АВ-11", "АВ-12"]))
+
+    text, buttons = rozklad("ЗІ-47")
+    assert "ще не відома" in text and buttons == ["🔎 Шукати «ЗІ-47»"]
+    text, buttons = rozklad("АВ-13")
+    assert "ще не відома" in text and buttons[-1] == "🔎 Шукати «АВ-13»"
+
+    bot.GROUP_INDEX.seed(["АВ-11", "АВ-12", "ЗІ-47"])
+    text, buttons = rozklad("АВ-13")
+    assert "не знайдено" in text and "🔎 Шукати «АВ-13»" not in buttons
+    text, buttons = rozklad("КН-99")
+    assert text.startswith("❌") and not buttons
+
+    text, _ = rozklad("ав_11")
+    assert "<b>АВ-11</b>" in text and asyncio.run(bot.STATE.get_user_group(1)) == "АВ-11"
+
+
+def test_rozklad_name_too_long_for_buttons(monkeypatch):
+    monkeypatch.setattr(bot, 'GROUP_INDEX', GroupIndex(["АВ-11"]))
+    text, buttons = rozklad("Д" * 30)
+    assert text.startswith("❌") and not buttons
+    text, buttons = rozklad("АВ|11")
+    assert text.startswith("❌") and not buttons
+
+
+def test_rozklad_escapes_typed_name(monkeypatch):
+    monkeypatch.setattr(bot, 'GROUP_INDEX', GroupIndex(["АВ-11"]))
+    text, buttons = rozklad("<Х")
+    assert "<b>&lt;Х</b>" in text and buttons == ["🔎 Шукати «<Х»"]
+    bot.GROUP_INDEX.seed([])
+    for query in ("<Х", "<АВ-1"):
+        text, _ = rozklad(query)
+        assert "<b>&lt;" in text
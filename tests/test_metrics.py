@@ -0,0 +1,27 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Registry  # noqa: E402
+
+
+def test_function_backed_counter_is_exported_as_counter():
+    hits = [0]
+    registry = Registry()
+    registry.counter('cache_hits_total', "Cache hits", lambda: hits[0])
+    registry.gauge('cache_entries', "Cache entries", lambda: 3)
+    hits[0] = 7
+
+    text = registry.render()
+    assert "# TYPE cache_hits_total counter\ncache_hits_total 7\n" in text
+    assert "# TYPE cache_entries gauge\ncache_entries 3\n" in text
+
+
+def test_labelled_counter():
+    registry = Registry()
+    counter = registry.counter('requests_total', "Requests")
+    counter.inc(route="direct")
+    counter.inc(2, route="direct")
+    assert counter.value(route="direct") == 3
+    assert 'requests_total{route="direct"} 3' in registry.render()
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from push import PushScheduler, PUSH_TZ  # noqa: E402
+from state import MemoryBackend  # noqa: E402
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.sent = []
+
+    def submit(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+async def get_schedule(group):
+    return group
+
+
+def render(schedule, group, subgroup, week, now):
+    return f"{group} {subgroup} {week}", {}
+
+
+def test_slot_is_sent_by_one_replica_only():
+    async def main():
+        state = MemoryBackend()  # спільний для обох "реплік"
+        await state.set_subscription(1, "АВ-11", "1", "all", "07:30")
+        await state.set_subscription(2, "АВ-11", "1", "all", "07:30")
+        await state.set_subscription(3, "КН-21", "all", "chys", "07:30")
+        await state.set_subscription(4, "КН-21", "all", "chys", "08:00")
+
+        replicas = [PushScheduler(state.get_subscriptions, get_schedule, render, FakeDispatcher(), state=state)
+                    for _ in range(2)]
+        now = datetime(2026, 10, 19, 7, 30, tzinfo=PUSH_TZ)
+        queued = [await r.run_once(now) for r in replicas]
+        assert sorted(queued) == [0, 3]
+        assert sorted(chat for r in replicas for chat, _ in r.dispatcher.sent) == [1, 2, 3]
+
+        # Відписка на будь-якій репліці видна всім
+        assert await state.delete_subscription(2)
+        later = datetime(2026, 10, 20, 7, 30, tzinfo=PUSH_TZ)
+        assert sorted([await r.run_once(later) for r in replicas]) == [0, 2]
+    asyncio.run(main())
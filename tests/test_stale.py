@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('STORE_PATH', os.path.join(tempfile.mkdtemp(prefix='tests-'), 'schedule.db'))
+
+import bot  # noqa: E402
+from cache import RenderCache, ScheduleCache  # noqa: E402
+from parser import Schedule  # noqa: E402
+from state import MemoryBackend  # noqa: E402
+from store import ScheduleStore  # noqa: E402
+
+GROUP = "АВ-11"
+
+
+def make_replica(monkeypatch, tmp_path):
+    refreshes = []
+    monkeypatch.setattr(bot, 'STATE', MemoryBackend())
+    monkeypatch.setattr(bot, 'GROUP_CACHE', ScheduleCache(ttl=60))
+    monkeypatch.setattr(bot, 'STORE', ScheduleStore(str(tmp_path / 'schedule.db')))
+    monkeypatch.setattr(bot, 'FETCHED_AT', {})
+    monkeypatch.setattr(bot, 'refresh_in_background', refreshes.append)
+    # Локальна копія цієї репліки - дві години тому
+    bot.STORE.put_schedule(bot.group_key(GROUP), Schedule(GROUP, [], "old"), time.time() - 7200)
+    return refreshes
+
+
+def test_shared_state_wins_over_stale_local_copy(monkeypatch, tmp_path):
+    refreshes = make_replica(monkeypatch, tmp_path)
+    fresh = Schedule(GROUP, [], "fresh")
+    asyncio.run(bot.STATE.put_schedule(bot.group_key(GROUP), fresh, fetched_at=time.time() - 5))
+
+    assert asyncio.run(bot.get_group_schedule(GROUP)) is fresh
+    assert refreshes == [] and bot.data_as_of(GROUP) == ""
+    assert bot.group_key(GROUP) in bot.GROUP_CACHE
+
+
+def test_stale_local_copy_is_marked(monkeypatch, tmp_path):
+    refreshes = make_replica(monkeypatch, tmp_path)
+
+    assert asyncio.run(bot.get_group_schedule(GROUP)).preview == "old"
+    assert refreshes == [GROUP] and "Дані станом на" in bot.data_as_of(GROUP)
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.message = type('Message', (), {'chat_id': 1})()
+        self.edits = []
+
+    async def answer(self):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def test_unknown_day_is_answered_before_any_lookup(monkeypatch, tmp_path):
+    make_replica(monkeypatch, tmp_path)
+    monkeypatch.setattr(bot, 'RENDERED', RenderCache())
+    schedule = asyncio.run(bot.get_group_schedule(GROUP))
+    monkeypatch.setattr(bot, 'get_group_schedule', None)  # будь-яке звернення до розкладу впаде
+
+    query = FakeQuery(bot.encode('fd', GROUP, "all", "all", "Xx"))
+    asyncio.run(bot.handle_button(type('Update', (), {'callback_query': query})(), None))
+    assert query.edits == ["⚠️ Невідомий день."]
+    # Клавіатура днів і день без назви більше не ділять ключ кешу
+    bot.day_view(schedule, GROUP, "all", "all", None)
+    assert bot.days_view(schedule, GROUP, "all", "all") is None
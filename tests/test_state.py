@@ -0,0 +1,133 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('STORE_PATH', os.path.join(tempfile.mkdtemp(prefix='tests-'), 'schedule.db'))
+
+import bot  # noqa: E402
+from cache import ScheduleCache  # noqa: E402
+from parser import Schedule  # noqa: E402
+from state import MemoryBackend, RedisBackend, SharedRateLimiter, StateBackend  # noqa: E402
+from store import ScheduleStore  # noqa: E402
+
+KEY = ("АВ-11", "1", "1")
+
+
+# Фабрика "реплік": кожен виклик - окремий бекенд над одним і тим самим сховищем стану
+@pytest.fixture(params=['memory', 'redis'])
+def replicas(request):
+    if request.param == 'memory':
+        backend = MemoryBackend()
+        return lambda: backend
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # Lua-скрипти (GCRA, release) у fakeredis
+    server = fakeredis.FakeServer()
+    return lambda: RedisBackend(client=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StateBackend()
+
+
+def test_lock_released_only_with_own_token(replicas):
+    async def main():
+        a, b = replicas(), replicas()
+        token = await a.acquire_lock("schedule:АВ-11", ttl=5)
+        assert token and await b.acquire_lock("schedule:АВ-11", ttl=5) is None
+        await b.release_lock("schedule:АВ-11", "not-the-token")
+        assert await a.is_locked("schedule:АВ-11")
+        await a.release_lock("schedule:АВ-11", token)
+        assert not await b.is_locked("schedule:АВ-11")
+        assert await b.acquire_lock("schedule:АВ-11", ttl=5)
+    asyncio.run(main())
+
+
+def test_gcra_wait_sequence(replicas):
+    async def main():
+        a, b = replicas(), replicas()
+        # rate 1/с, burst 2: два запити одразу, третій чекає ~1 с - хоч би з якої репліки
+        waits = [await a.rate_wait("upstream", 1, 2), await b.rate_wait("upstream", 1, 2), await a.rate_wait("upstream", 1, 2)]
+        assert waits[:2] == [0, 0] and 0.9 < waits[2] <= 1.0
+        # Відмова не витрачає бюджет: наступна спроба чекає стільки ж
+        assert 0.9 < await b.rate_wait("upstream", 1, 2) <= 1.0
+    asyncio.run(main())
+
+
+def test_shared_rate_limiter_spaces_requests(replicas):
+    async def main():
+        limiters = [SharedRateLimiter(replicas(), rate=20, burst=1) for _ in range(2)]
+        started = time.monotonic()
+        for limiter in limiters * 2: await limiter.acquire()
+        assert time.monotonic() - started >= 0.14  # 4 запити при 20/с і burst 1 - щонайменше 3 інтервали
+    asyncio.run(main())
+
+
+def test_seed_user_groups_keeps_existing(replicas):
+    async def main():
+        a, b = replicas(), replicas()
+        await a.set_user_group(1, "КН-21")
+        await b.seed_user_groups({1: "АВ-11", 2: "АВ-12"})
+        assert await a.get_user_group(1) == "КН-21" and await a.get_user_group(2) == "АВ-12"
+    asyncio.run(main())
+
+
+def test_schedule_entry_round_trip(replicas):
+    async def main():
+        a, b = replicas(), replicas()
+        await a.put_schedule(KEY, Schedule("АВ-11", [], "preview"), ttl=60, fetched_at=1760000000.5)
+        fetched_at, schedule = await b.get_schedule_entry(KEY)
+        assert fetched_at == 1760000000.5 and schedule.group == "АВ-11" and schedule.preview == "preview"
+        assert (await b.get_schedule(KEY)).group == "АВ-11"
+        assert await b.get_schedule_entry(("КН-21", "1", "1")) is None
+    asyncio.run(main())
+
+
+def test_subscriptions(replicas):
+    async def main():
+        a, b = replicas(), replicas()
+        await a.set_subscription(1, "АВ-11", "1", "all", "07:30")
+        assert await b.get_subscriptions() == {1: ("АВ-11", "1", "all", "07:30")}
+        assert await b.delete_subscription(1) and not await a.delete_subscription(1)
+        assert await a.get_subscriptions() == {}
+    asyncio.run(main())
+
+
+def test_fetch_shared_fetches_once(replicas, monkeypatch, tmp_path):
+    fetches = []
+
+    async def fetch_schedule(client, group, semester, previous):
+        fetches.append(group)
+        await asyncio.sleep(0.3)
+        return Schedule(group, [], "fresh")
+
+    monkeypatch.setattr(bot, 'fetch_schedule', fetch_schedule)
+    monkeypatch.setattr(bot, 'STATE', replicas())
+    monkeypatch.setattr(bot, 'STORE', ScheduleStore(str(tmp_path / 'schedule.db')))
+    monkeypatch.setattr(bot, 'GROUP_CACHE', ScheduleCache())
+    monkeypatch.setattr(bot, 'FETCHED_AT', {})
+
+    async def main():
+        return await asyncio.gather(bot.fetch_shared("АВ-11"), bot.fetch_shared("АВ-11"))
+
+    first, second = asyncio.run(main())
+    assert fetches == ["АВ-11"]
+    assert first.preview == second.preview == "fresh"
+
+
+def test_memory_locks_expire():
+    now = [0.0]
+    backend = MemoryBackend(clock=lambda: now[0])
+    async def main():
+        # Доба хвилинних слотів розсилки: жодне блокування не відпускають явно
+        for minute in range(1440):
+            assert await backend.acquire_lock(f"push:2026-10-18 {minute // 60:02d}:{minute % 60:02d}", ttl=120)
+            now[0] += 60
+        assert len(backend._locks) <= 3
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import Schedule  # noqa: E402
+from store import ScheduleStore  # noqa: E402
+
+KEY = ("АВ-11", "1", "1")
+
+
+# З'єднання SQLite, яке (поки fail=True) падає на записі і запам'ятовує, з якого потоку писали
+class FlakyConnection:
+    def __init__(self, conn, factory):
+        self.conn = conn
+        self.factory = factory
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+    def executemany(self, sql, rows):
+        self.factory.threads.add(threading.current_thread())
+        if self.factory.fail: raise sqlite3.OperationalError("database is locked")
+        return self.conn.executemany(sql, rows)
+
+
+class FlakyConnect:
+    def __init__(self):
+        self.fail = False
+        self.threads = set()
+
+    def __call__(self, *args, **kwargs):
+        return FlakyConnection(sqlite3.connect(*args, **kwargs), self)
+
+
+def test_failed_flush_keeps_batch(tmp_path):
+    connect = FlakyConnect()
+    store = ScheduleStore(str(tmp_path / "schedule.db"), batch_size=100, connect=connect).open()
+    store.put_schedule(KEY, Schedule("АВ-11", []))
+    store.set_user_group(1, "АВ-11")
+    store.set_subscription(1, "АВ-11", "all", "all", "07:30")
+
+    connect.fail = True
+    try:
+        store.flush()
+        assert False, "flush should fail"
+    except sqlite3.OperationalError:
+        pass
+    assert store.get_schedule(KEY) is not None
+    assert store.user_groups() == {1: "АВ-11"}
+
+    connect.fail = False
+    store.close()
+
+    reopened = ScheduleStore(str(tmp_path / "schedule.db")).open()
+    assert reopened.get_schedule(KEY) is not None
+    assert reopened.user_groups() == {1: "АВ-11"}
+    assert reopened.subscriptions() == {1: ("АВ-11", "all", "all", "07:30")}
+    reopened.close()
+
+
+def test_batch_flush_runs_off_the_event_loop(tmp_path):
+    async def main():
+        connect = FlakyConnect()
+        store = ScheduleStore(str(tmp_path / "schedule.db"), batch_size=2, connect=connect).open()
+        store.set_user_group(1, "АВ-11")
+        store.set_user_group(2, "АВ-12")
+        for _ in range(100):
+            if connect.threads: break
+            await asyncio.sleep(0.01)
+        assert connect.threads and threading.main_thread() not in connect.threads
+        assert await store.load_schedule(KEY) is None
+        store.close()
+    asyncio.run(main())
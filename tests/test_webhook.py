@@ -0,0 +1,76 @@
+import asyncio
+import json
+import os
+import sys
+
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook import WebhookServer, webhook_secret  # noqa: E402
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'updates.json'), encoding='utf-8') as f:
+    UPDATES = json.load(f)
+SECRET = "test-secret"
+HEADERS = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+
+
+class FakeBot:
+    def __init__(self, token):
+        self.token = token
+
+
+class FakeApplication:
+    def __init__(self, token="123456:TEST"):
+        self.update_queue = asyncio.Queue()
+        self.bot = FakeBot(token)
+
+
+def post(server, *requests):
+    async def main():
+        async with TestClient(TestServer(server.make_app())) as client:
+            statuses = []
+            for body, headers in requests:
+                response = await client.post(server.path, data=body, headers=headers)
+                statuses.append(response.status)
+            return statuses
+    return asyncio.run(main())
+
+
+def test_accepts_recorded_updates():
+    server = WebhookServer(FakeApplication(), secret=SECRET)
+    assert post(server, *[(json.dumps(u), HEADERS) for u in UPDATES]) == [200, 200]
+    queue = server.application.update_queue
+    first, second = queue.get_nowait(), queue.get_nowait()
+    assert first.message.text == "/rozklad АВ-11"
+    assert second.callback_query.data == "v1|s|АВ-11|1"
+
+
+def test_rejects_missing_or_wrong_secret():
+    server = WebhookServer(FakeApplication(), secret=SECRET)
+    body = json.dumps(UPDATES[0])
+    assert post(server, (body, {}), (body, {'X-Telegram-Bot-Api-Secret-Token': "wrong"})) == [403, 403]
+    assert server.application.update_queue.empty()
+
+
+def test_replicas_without_secret_share_one():
+    replicas = [WebhookServer(FakeApplication("123456:TEST"), secret=None) for _ in range(2)]
+    headers = {'X-Telegram-Bot-Api-Secret-Token': webhook_secret("123456:TEST")}
+    body = json.dumps(UPDATES[0])
+    for server in replicas:
+        assert post(server, (body, headers), (body, {})) == [200, 403]
+    assert replicas[0].secret != WebhookServer(FakeApplication("654321:OTHER"), secret=None).secret
+    assert "123456" not in replicas[0].secret
+
+
+def test_queue_full_returns_503():
+    server = WebhookServer(FakeApplication(), secret=SECRET, max_pending=1)
+    body = json.dumps(UPDATES[0])
+    assert post(server, (body, HEADERS), (body, HEADERS)) == [200, 503]
+    assert server.application.update_queue.qsize() == 1
+
+
+def test_bad_json_returns_400():
+    server = WebhookServer(FakeApplication(), secret=SECRET)
+    assert post(server, ("{not json", HEADERS), ("[1, 2]", HEADERS)) == [400, 400]
+    assert server.application.update_queue.empty()
@@ -0,0 +1,106 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+
+from aiohttp import web
+from telegram import Update
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIG ---
+# Якщо WEBHOOK_URL задано (публічна адреса, напр. https://bot.example.com), бот працює через вебхук
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram')
+# Без WEBHOOK_SECRET секрет виводиться з токена бота - однаковий на всіх репліках
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.environ.get('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('PORT', 8080))
+# Скільки оновлень обробляється одночасно (і для вебхука, і для polling)
+UPDATE_CONCURRENCY = int(os.environ.get('UPDATE_CONCURRENCY', 32))
+# Понад цю чергу відповідаємо 503 - Telegram повторить доставку пізніше
+WEBHOOK_MAX_PENDING = int(os.environ.get('WEBHOOK_MAX_PENDING', 1000))
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', 40))
+
+WEBHOOK_UPDATES = REGISTRY.counter('webhook_updates_total', "Webhook requests by result (accepted/rejected/invalid/forbidden)")
+
+
+# HMAC токена: кожна репліка, що викликає set_webhook, реєструє той самий секрет, а сам токен не світиться
+def webhook_secret(token):
+    return hmac.new(token.encode(), b"telegram-webhook-secret", hashlib.sha256).hexdigest()
+
+
+# --- ВЕБХУК (aiohttp) ---
+# Оновлення кладуться в update_queue застосунку й одразу підтверджуються; обробляє їх сам
+# Application з обмеженням concurrent_updates. Тут же - /, /health і /metrics замість Flask.
+class WebhookServer:
+    def __init__(self, application, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET, max_pending=WEBHOOK_MAX_PENDING):
+        self.application = application
+        self.path = path
+        if not secret:
+            token = getattr(application.bot, 'token', None)
+            if not token: raise RuntimeError("Для вебхука потрібен WEBHOOK_SECRET або токен бота")
+            secret = webhook_secret(token)
+        self.secret = secret
+        self.max_pending = max_pending
+        self._runner = None
+        REGISTRY.gauge('update_queue_size', "Updates accepted and not yet picked up by a handler",
+                       lambda: self.application.update_queue.qsize())
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/', self.index)
+        app.router.add_get('/health', self.health)
+        app.router.add_get('/metrics', self.metrics)
+        app.router.add_post(self.path, self.handle_update)
+        return app
+
+    async def index(self, request):
+        return web.Response(text="Bot is running!")
+
+    async def health(self, request):
+        return web.Response(text="OK")
+
+    async def metrics(self, request):
+        return web.Response(text=REGISTRY.render(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+    async def handle_update(self, request):
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            WEBHOOK_UPDATES.inc(result='forbidden')
+            return web.Response(status=403)
+
+        if self.application.update_queue.qsize() >= self.max_pending:
+            WEBHOOK_UPDATES.inc(result='rejected')
+            return web.Response(status=503)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Bad webhook payload: {e}")
+            WEBHOOK_UPDATES.inc(result='invalid')
+            return web.Response(status=400)
+
+        await self.application.update_queue.put(update)
+        WEBHOOK_UPDATES.inc(result='accepted')
+        return web.Response()
+
+    async def start(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT, url=WEBHOOK_URL):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Webhook listening on {host}:{port}{self.path}")
+        if url:
+            await self.application.bot.set_webhook(url=url.rstrip('/') + self.path, secret_token=self.secret,
+                                                   max_connections=WEBHOOK_MAX_CONNECTIONS,
+                                                   allowed_updates=Update.ALL_TYPES)
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None